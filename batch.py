@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import pandas as pd
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import training as train
+from portfolio import evaluate_sites
+from sweep import DEFAULTS, write_results
+
+# Headless batch runner over training.Assets, it never imports streamlit.
+#   python batch.py scenarios.csv -o results.parquet
+#   python batch.py fleet.json -o results.npy --prices prices.csv --processes 4
+# Scenario files have one row (CSV) or object (JSON) per scenario with the columns of a
+# portfolio sites file: capacity, the Scenario parameters and price./cost. columns.
+# A JSON file is a list of scenarios or {"defaults": {...}, "scenarios": [...]}.
+# --prices and --costs take a technology x commodity table in euro / kWh (CO2 and H2
+# in euro / t), as edited in Tutorial 3, in place of the reference prices and costs.
+
+
+def read_scenarios(path: str):
+    """Scenarios of a CSV or JSON file as a DataFrame"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return pd.read_csv(path)
+    if extension == ".json":
+        with open(path) as file:
+            data = json.load(file)
+        if isinstance(data, dict):
+            defaults = data.get("defaults", {})
+            data = [{**defaults, **scenario} for scenario in data["scenarios"]]
+        return pd.DataFrame(data)
+    raise ValueError(f"Unsupported scenario format: {extension}")
+
+
+def read_table(path: str, technologies: list = train.TECHNOLOGIES):
+    """Technology x commodity table of a CSV file in euro / kWh, returned in keuro / kWh
+    Missing technologies or commodities raise a KeyError"""
+    table = pd.read_csv(path, index_col=0)
+    return table.loc[technologies, train.COMMODITIES].values.astype(float) / 1000
+
+
+def _evaluate_chunk(task):
+    scenarios, prices, costs = task
+    results, _ = evaluate_sites(scenarios, train.Assets(DEFAULTS["capacity"]), prices, costs)
+    # inputs next to the results, the site column is the scenario identifier if any
+    return pd.concat([scenarios.reset_index(drop=True), results.drop(columns="site")], axis=1)
+
+
+def run_batch(scenarios: pd.DataFrame,
+              processes: int = None,
+              chunksize: int = 50000,
+              prices=None,
+              costs=None,
+              output: str = None):
+    """Evaluates every scenario against every technology across a process pool
+    receives:
+    scenarios: DataFrame from read_scenarios
+    processes: number of worker processes, defaults to all cores, 1 runs in-process
+    chunksize: scenarios evaluated per vectorized batch in a worker
+    prices, costs: keuro / kWh tables replacing the reference ones
+    output: optional .csv, .parquet (requires pyarrow), .npy or .npz file for the results
+    returns the scenarios with NPV, capital costs, payback and payback year per technology
+    and the technology with the best NPV"""
+    if len(scenarios) == 0:
+        raise ValueError("No scenarios to run")
+    processes = processes or os.cpu_count() or 1
+    tasks = [(scenarios.iloc[start:start + chunksize], prices, costs)
+             for start in range(0, len(scenarios), chunksize)]
+
+    if processes == 1 or len(tasks) == 1:
+        chunks = [_evaluate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            chunks = list(pool.map(_evaluate_chunk, tasks))
+
+    results = pd.concat(chunks, ignore_index=True)
+    if output is not None:
+        write_results(results, output)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch evaluation of training.Assets scenarios")
+    parser.add_argument("scenarios", help="CSV or JSON scenario file")
+    parser.add_argument("-o", "--output", required=True, help=".csv, .parquet, .npy or .npz results file, .parquet requires pyarrow")
+    parser.add_argument("--prices", help="CSV price table (euro / kWh) replacing the reference prices")
+    parser.add_argument("--costs", help="CSV fuel cost table (euro / kWh) replacing the reference costs")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--chunksize", type=int, default=50000, help="scenarios per vectorized batch")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    scenarios = read_scenarios(args.scenarios)
+    prices = read_table(args.prices) if args.prices else None
+    costs = read_table(args.costs) if args.costs else None
+    results = run_batch(scenarios, args.processes, args.chunksize, prices, costs, args.output)
+    print(f"{len(results)} scenarios written to {args.output} in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+import argparse
+import datetime
+import json
+import numpy as np
+import os
+import pandas as pd
+import platform
+import sys
+import time
+import training as train
+from hourly import HOURS, simulate_hours
+
+# Benchmarks of the training.Assets hot paths.
+#   python benchmarks.py                 time, check and compare with the last runs
+#   python benchmarks.py --threshold 0.5 allow 50% slowdowns
+# Results are appended to HISTORY, the exit code is 1 on a regression or a wrong answer.
+HERE = os.path.dirname(os.path.abspath(__file__))
+HISTORY = os.path.join(HERE, "benchmark_history.json")
+# results recorded from the original pandas implementation of Assets
+REFERENCE = os.path.join(HERE, "data", "reference_results.npz")
+
+SIZES = [1, 1000, 100000]
+CAPACITIES = [1000000, 2700000, 5400000, 10800000]
+SCENARIOS = [(0.5, 0.05, 0.36, 0.4, 0.48, 0.60, 0.28),
+             (0.9, 0.10, 0.36, 0.3, 0.50, 0.50, 0.30),
+             (0.0, 0.10, 0.20, 0.45, 0.60, 0.60, 0.35)]
+
+
+def edited_costs(assets):
+    """A Tutorial 3 style cost table with user edits"""
+    costs = assets.calc_fcosts() * 1000
+    costs["H2"] = 1500
+    costs.loc["ADCHP", "electricity"] = 0.1
+    return costs
+
+
+def record_reference(path: str = REFERENCE, module=train):
+    """Records reference results of module.Assets for the reference scenarios"""
+    empty = 0 * pd.DataFrame()
+    records = {name: [] for name in ["inputs", "edited", "cflows", "npv", "payback", "production", "consumption"]}
+    for capacity in CAPACITIES:
+        for scenario in SCENARIOS:
+            for edited in (False, True):
+                assets = module.Assets(capacity)
+                costs = edited_costs(assets) if edited else empty
+                cflows, cumcflows, npv = assets.calc_npv(*scenario, empty, costs)
+                records["inputs"].append((capacity,) + scenario)
+                records["edited"].append(edited)
+                records["cflows"].append(cflows.values)
+                records["npv"].append(npv.values)
+                records["payback"].append(assets.calc_payback(*scenario, empty, costs).values)
+                records["production"].append(assets.calc_production(*scenario[3:]).values)
+                records["consumption"].append(assets.calc_consumption(*scenario[3:]).values)
+    np.savez_compressed(path, **{name: np.array(values) for name, values in records.items()})
+
+
+def check_reference(path: str = REFERENCE, rtol: float = 1e-9):
+    """Compares every engine with the reference results, returns a list of failures"""
+    reference = np.load(path)
+    empty = 0 * pd.DataFrame()
+    failures = []
+
+    def check(name, actual, expected):
+        if not np.allclose(actual, expected, rtol=rtol, atol=1e-9):
+            failures.append(name)
+
+    inputs = reference["inputs"]
+    for i, (row, edited) in enumerate(zip(inputs, reference["edited"])):
+        capacity, scenario = row[0], tuple(row[1:])
+        assets = train.Assets(capacity)
+        costs = edited_costs(assets) if edited else empty
+        train.memo.clear()
+        train.physical_memo.clear()
+        cflows, cumcflows, npv = assets.calc_npv(*scenario, empty, costs)
+        check(f"calc_npv cash flows {i}", cflows.values, reference["cflows"][i])
+        check(f"calc_npv {i}", npv.values, reference["npv"][i])
+        check(f"calc_payback {i}", assets.calc_payback(*scenario, empty, costs).values, reference["payback"][i])
+        check(f"calc_production {i}", assets.calc_production(*scenario[3:]).values, reference["production"][i])
+        check(f"calc_consumption {i}", assets.calc_consumption(*scenario[3:]).values, reference["consumption"][i])
+        rates = assets.calc_npv_rates([scenario[1]], scenario[0], *scenario[2:], empty, costs)
+        check(f"calc_npv_rates {i}", rates.values[0], reference["npv"][i])
+
+    # the batch engine on all reference scenarios at once
+    plain = ~reference["edited"]
+    batch = train.Assets(CAPACITIES[0]).calc_batch(inputs[plain, 0], *inputs[plain, 1:].transpose())
+    check("calc_batch cash flows", batch.cflows, reference["cflows"][plain])
+    check("calc_batch npv", batch.npv, reference["npv"][plain])
+    check("calc_batch payback", batch.payback, reference["payback"][plain])
+
+    # an hourly simulation with flat series, running every hour, equals calc_batch
+    assets = train.Assets(CAPACITIES[0])
+    electricity = assets.registry.prices[assets.technologies.index("ADCHP"), train.COMMODITIES.index("electricity")]
+    hourly = simulate_hours(assets, inputs[plain, 0], *inputs[plain, 1:].transpose(),
+                            prices={"electricity": np.full(HOURS, electricity * 1000)}, dispatch=False)
+    check("hourly npv", hourly.batch.npv, batch.npv)
+    check("hourly cash flows", hourly.batch.cflows, batch.cflows)
+
+    # year-indexed trajectories with flat factors equal calc_batch
+    flat = {commodity: np.ones(assets.lifetime + 1) for commodity in train.COMMODITIES}
+    trajectories = assets.calc_trajectories(inputs[plain, 0], *inputs[plain, 1:].transpose(),
+                                            price_factors=flat, cost_factors=flat)
+    for name in ["cflows", "cumcflows", "npv", "payback", "payback_year", "discounted_payback_year"]:
+        check(f"calc_trajectories {name}", getattr(trajectories, name), getattr(batch, name))
+
+    # the NPV of calc_batch is zero at the internal rate of return
+    rate = assets.calc_batch_irr(batch.capex, batch.cf_wam, batch.cf_woam).rate
+    found = np.isfinite(rate)
+    npv = assets.discount(np.where(found, rate, 0), batch.capex, batch.cf_wam, batch.cf_woam)
+    check("calc_batch_irr npv", (npv / batch.capex)[found], 0)
+    return failures
+
+
+def timeit(function, budget: float = 0.2, repeats: int = 5):
+    """Best time per call in seconds, the number of calls adapts to a time budget"""
+    start = time.perf_counter()
+    function()
+    single = time.perf_counter() - start
+    number = max(1, int(budget / repeats / max(single, 1e-9)))
+    best = single
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def method_calls(assets):
+    """Arguments of the public calc_* methods of Assets on one plant
+    calc_batch and its building blocks are timed by batch size in run_benchmarks"""
+    empty = 0 * pd.DataFrame()
+    capsubsidy, drate, taxrate, CO2split, biometyield, heatgen, elecgen = SCENARIOS[0]
+    flows = (CO2split, biometyield, heatgen, elecgen)
+    full = SCENARIOS[0] + (empty, empty)
+    batch = assets.calc_batch(np.array([CAPACITIES[1]]), *SCENARIOS[0])
+    return {"calc_units": (),
+            "cap2prod": (),
+            "cap2cons": (),
+            "calc_capcosts": (CO2split,),
+            "calc_unitconsumption": (CO2split,),
+            "calc_unitproduction": flows,
+            "calc_production": flows,
+            "calc_consumption": flows,
+            "calc_prices": (),
+            "calc_fcosts": (),
+            "calc_revenues": flows + (empty,),
+            "calc_costs": (capsubsidy, CO2split),
+            "calc_fuelcosts": flows + (empty,),
+            "calc_amort": (capsubsidy, CO2split),
+            "calc_capsub": (capsubsidy, CO2split),
+            "calc_cf_wam": (capsubsidy, taxrate) + flows + (empty, empty),
+            "calc_cf_woam": (capsubsidy, taxrate) + flows + (empty, empty),
+            "calc_rates": (drate, 1, assets.lifetime),
+            "calc_cashflows": full,
+            "calc_npv": full,
+            "calc_payback": full,
+            "calc_payback_years": full,
+            "calc_irr": full,
+            "calc_cashflows_irr": (assets.calc_cashflows(*full),),
+            "calc_batch_irr": (batch.capex, batch.cf_wam, batch.cf_woam),
+            "calc_npv_rates": (np.linspace(0, 0.15, 100), capsubsidy, taxrate) + flows + (empty, empty),
+            "calc_trajectories": (np.array([CAPACITIES[1]]), capsubsidy, drate, taxrate) + flows}
+
+
+def run_benchmarks(sizes=SIZES, budget: float = 0.2):
+    """Times the calc_* methods and the page pipeline, returns {name: seconds}"""
+    results = {}
+    assets = train.Assets(CAPACITIES[1])
+    for name, args in method_calls(assets).items():
+        method = getattr(assets, name)
+
+        def call():
+            # every call is a cache miss, of the scenario and the physical layer caches
+            train.memo.clear()
+            train.physical_memo.clear()
+            method(*args)
+        results[f"method.{name}"] = timeit(call, budget)
+
+    rng = np.random.default_rng(0)
+    empty = 0 * pd.DataFrame()
+    for size in sizes:
+        capacities = rng.choice(CAPACITIES, size)
+        scenario = [rng.uniform(0, 0.9, size), rng.uniform(0.02, 0.12, size)] + list(SCENARIOS[0][2:])
+        results[f"batch.calc_batch.{size}"] = timeit(lambda: assets.calc_batch(capacities, *scenario), budget)
+        if size == 1:
+            # what a page rerun does
+            def page():
+                train.memo.clear()
+                train.physical_memo.clear()
+                cashflows = train.Assets(capacities[0]).calc_cashflows(scenario[0][0], scenario[1][0],
+                                                                       *scenario[2:], empty, empty)
+                cashflows.cumulative.transpose()
+                cashflows.payback.transpose()
+            results["page.pipeline.1"] = timeit(page, budget)
+    return results
+
+
+def load_history(path: str = HISTORY):
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)
+
+
+def baseline(history: list, window: int):
+    """Median time of every path over the last window runs"""
+    runs = [run["results"] for run in history[-window:]]
+    names = set(name for run in runs for name in run)
+    return {name: float(np.median([run[name] for run in runs if name in run])) for name in names}
+
+
+def compare(results: dict, previous: dict, threshold: float):
+    """Names of the paths slower than the baseline by more than threshold"""
+    return [name for name, seconds in results.items()
+            if name in previous and seconds > previous[name] * (1 + threshold)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of training.Assets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="batch sizes")
+    parser.add_argument("--threshold", type=float, default=0.25, help="tolerated relative slowdown")
+    parser.add_argument("--budget", type=float, default=0.2, help="seconds spent timing each path")
+    parser.add_argument("--history", default=HISTORY, help="JSON history file")
+    parser.add_argument("--window", type=int, default=5, help="past runs the baseline is taken from")
+    parser.add_argument("--no-record", action="store_true", help="do not append this run to the history")
+    parser.add_argument("--record-reference", action="store_true",
+                        help="overwrite the reference results with the current implementation")
+    args = parser.parse_args(argv)
+
+    if args.record_reference:
+        record_reference()
+        print("Reference results written to", REFERENCE)
+        return 0
+
+    failures = check_reference()
+    for name in failures:
+        print("MISMATCH", name)
+
+    results = run_benchmarks(args.sizes, args.budget)
+    history = load_history(args.history)
+    previous = baseline(history, args.window)
+    regressions = compare(results, previous, args.threshold)
+    for name, seconds in results.items():
+        change = f"{seconds / previous[name] - 1:+.0%}" if name in previous else ""
+        flag = "REGRESSION" if name in regressions else ""
+        print(f"{name:<36} {seconds * 1000:12.4f} ms {change:>7} {flag}")
+
+    if not args.no_record:
+        history.append({"timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                        "python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "pandas": pd.__version__,
+                        "results": results})
+        with open(args.history, "w") as file:
+            json.dump(history, file, indent=1)
+
+    return 1 if failures or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import training as train
+from sweep import DEFAULTS, PARAMETERS, key_hint
+
+# Break-even variables
+#   capsubsidy: capital subsidy (fraction of the capital costs)
+#   capacity: plant capacity (cm/y), bisected on a log scale
+#   price.<commodity>, cost.<commodity>: price or fuel cost of a commodity for every
+#       technology, in euro / kWh (CO2 and H2 in euro / t) as in the Tutorial 3 tables
+BOUNDS = {"capsubsidy": (0.0, 1.0),
+          "capacity": (1e4, 1e9)}
+
+
+def default_bounds(variable: str, assets):
+    """Search interval of a variable, prices and costs span zero to ten times the reference"""
+    if variable in BOUNDS:
+        return BOUNDS[variable]
+    kind, commodity = variable.split(".", 1)
+    table = assets.registry.prices if kind == "price" else assets.registry.costs
+    reference = np.abs(table[:, train.COMMODITIES.index(commodity)]).max() * 1000
+    return (0.0, 10 * reference if reference > 0 else 1.0)
+
+
+def check_variable(variable: str):
+    if variable in BOUNDS:
+        return
+    kind, _, commodity = variable.partition(".")
+    if kind not in ("price", "cost") or commodity not in train.COMMODITIES:
+        raise ValueError(f"Unknown break-even variable: {variable}{key_hint(variable)}")
+
+
+def technology_npv(assets, variable: str, values: np.ndarray, inputs: dict, prices, costs):
+    """NPV of each technology when the variable takes the value of its column
+    receives scenario x technology values, evaluates every scenario once per technology
+    (taxes depend on all the technologies of a plant) and keeps the matching NPV"""
+    n, technologies = values.shape
+    inputs = {name: np.repeat(value, technologies) for name, value in inputs.items()}
+    x = values.ravel()
+    if variable in BOUNDS:
+        inputs[variable] = x
+    tables = {"price": prices, "cost": costs}
+    if variable not in BOUNDS:
+        kind, commodity = variable.split(".", 1)
+        table = np.broadcast_to(tables[kind], (n,) + tables[kind].shape[-2:])
+        table = np.repeat(table, technologies, axis=0)
+        table[:, :, train.COMMODITIES.index(commodity)] = x[:, None] / 1000
+        tables[kind] = table
+    batch = assets.calc_batch(inputs["capacity"], *[inputs[name] for name in train.Scenario.parameters],
+                              prices=tables["price"], costs=tables["cost"])
+    npv = batch.npv.reshape(n, technologies, technologies)
+    return npv[:, np.arange(technologies), np.arange(technologies)]
+
+
+def solve_breakeven(variable: str,
+                    bounds=None,
+                    xtol: float = 1e-6,
+                    maxiter: int = 100,
+                    assets=None,
+                    prices=None,
+                    costs=None,
+                    **values):
+    """Value of a variable at which the NPV of each technology turns to zero
+    receives:
+    variable: capsubsidy, capacity, price.<commodity> or cost.<commodity>
+    bounds: (low, high) search interval, scalars or arrays per scenario, see default_bounds
+    xtol: interval width at which the bisection stops (relative for capacity)
+    prices, costs: base tables (keuro / kWh) as in Assets.calc_batch, the variable overrides its column
+    values: any of sweep.PARAMETERS as scalars or arrays, one scenario per element,
+        parameters not given are fixed to sweep.DEFAULTS
+    returns a scenario x technology DataFrame, NaN where the NPV does not change sign in the interval
+    All scenarios and technologies are bisected together, one calc_batch call per step"""
+    check_variable(variable)
+    unknown = set(values) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {sorted(unknown)}")
+    assets = assets or train.Assets(DEFAULTS["capacity"])
+    prices = assets.registry.prices if prices is None else np.asarray(prices, dtype=float)
+    costs = assets.registry.costs if costs is None else np.asarray(costs, dtype=float)
+
+    inputs = {name: np.asarray(values.get(name, DEFAULTS[name]), dtype=float) for name in PARAMETERS}
+    inputs = dict(zip(inputs, np.broadcast_arrays(*[np.atleast_1d(value) for value in inputs.values()])))
+    n = len(inputs["capacity"])
+    shape = (n, len(assets.registry))
+    low, high = default_bounds(variable, assets) if bounds is None else bounds
+    low = np.broadcast_to(np.asarray(low, dtype=float)[..., None], shape).copy()
+    high = np.broadcast_to(np.asarray(high, dtype=float)[..., None], shape).copy()
+
+    geometric = variable == "capacity"
+    f_low = technology_npv(assets, variable, low, inputs, prices, costs)
+    f_high = technology_npv(assets, variable, high, inputs, prices, costs)
+    bracketed = np.sign(f_low) != np.sign(f_high)
+
+    for _ in range(maxiter):
+        width = high / low - 1 if geometric else high - low
+        if np.all(width[bracketed] <= xtol):
+            break
+        middle = np.sqrt(low * high) if geometric else (low + high) / 2
+        f_middle = technology_npv(assets, variable, middle, inputs, prices, costs)
+        # keep the half where the sign changes
+        lower = np.sign(f_middle) == np.sign(f_low)
+        low = np.where(lower, middle, low)
+        f_low = np.where(lower, f_middle, f_low)
+        high = np.where(lower, high, middle)
+
+    root = np.sqrt(low * high) if geometric else (low + high) / 2
+    return pd.DataFrame(np.where(bracketed, root, np.nan), columns=assets.technologies)
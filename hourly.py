@@ -0,0 +1,143 @@
+import numpy as np
+from typing import NamedTuple
+import training as train
+
+# Hourly operation over one year. Biogas is produced every hour and each technology
+# processes it at the hourly prices, the annual totals feed the usual cash flows.
+HOURS = 8760 # h/y
+
+
+class HourlyResult(NamedTuple):
+    """Results of an hourly simulation
+    batch: BatchResult built from the annual totals of the simulated year
+    operating_hours: plant x technology hours in operation
+    biogas_used: plant x technology biogas processed (cm/y), the rest is flared"""
+    batch: train.BatchResult
+    operating_hours: np.ndarray
+    biogas_used: np.ndarray
+
+
+def hourly_series(values, n: int):
+    """Broadcasts an hourly series (hour or plant x hour) to plant x hour"""
+    values = np.asarray(values, dtype=float)
+    if values.shape[-1] != HOURS:
+        raise ValueError(f"Hourly series of {values.shape[-1]} values, {HOURS} expected")
+    return np.broadcast_to(values, (n, HOURS))
+
+
+def flat_biogas(assets, capacities):
+    """Constant hourly biogas production (cm/h) with the annual production of calc_production"""
+    capacities = np.atleast_1d(np.asarray(capacities, dtype=float))
+    return np.broadcast_to((capacities * assets.utilisation_factor / HOURS)[:, None], (len(capacities), HOURS))
+
+
+def split_table(table: np.ndarray, series: dict, n: int):
+    """Splits prices or costs into a table without the hourly commodities and the hourly series
+    receives a technology x commodity table (keuro / kWh) and {commodity: series} in euro / kWh,
+    returns (table, [(commodity index, plant x hour series in keuro / kWh)])"""
+    table = np.array(table, dtype=float)
+    hourly = []
+    for commodity, values in (series or {}).items():
+        c = train.COMMODITIES.index(commodity)
+        table[..., c] = 0
+        hourly.append((c, hourly_series(np.asarray(values, dtype=float) / 1000, n)))
+    return table, hourly
+
+
+def simulate_hours(assets,
+                   capacities,
+                   capsubsidy,
+                   drate,
+                   taxrate,
+                   CO2split,
+                   biometyield,
+                   heatgen,
+                   elecgen,
+                   biogas=None,
+                   prices=None,
+                   costs=None,
+                   dispatch: bool = True,
+                   chunksize: int = 256):
+    """Simulates a year of hourly operation for a batch of plants
+    receives:
+    assets: Assets providing the technologies and conversion factors
+    capacities, capsubsidy, ..., elecgen: as in Assets.calc_batch
+    biogas: hourly biogas production (cm/h), hour or plant x hour,
+        defaults to flat_biogas (the annual production of calc_production)
+    prices, costs: {commodity: hourly series} in euro / kWh (CO2 and H2 in euro / t),
+        hour or plant x hour, other commodities keep the reference prices and costs
+    dispatch: technologies only run in the hours with a positive operating margin
+        (revenues minus fuel costs), with False they run whenever there is biogas
+    chunksize: plants simulated at once, bounds the plant x technology x hour arrays
+    returns an HourlyResult, with flat series and profitable operation its batch
+    equals Assets.calc_batch"""
+    capacities = np.atleast_1d(np.asarray(capacities, dtype=float))
+    n = len(capacities)
+    CO2split, biometyield, heatgen, elecgen = [np.broadcast_to(np.asarray(p, dtype=float), (n,))
+                                               for p in (CO2split, biometyield, heatgen, elecgen)]
+    biogas = flat_biogas(assets, capacities) if biogas is None else hourly_series(biogas, n)
+
+    # flows per cm of biogas processed, plant x technology x commodity
+    unitprod = assets._batch_unitproduction(capacities, CO2split, biometyield, heatgen, elecgen)
+    prod_yield = unitprod * assets._cap2prod() * assets.hours
+    cons_yield = assets._batch_unitconsumption(capacities, CO2split)
+    static_prices, hourly_prices = split_table(assets.registry.prices, prices, n)
+    static_costs, hourly_costs = split_table(assets.registry.costs, costs, n)
+
+    shape = (n, len(assets.registry))
+    used = np.zeros(shape)
+    hours = np.zeros(shape)
+    # revenues and fuel costs per cm of biogas at the constant prices
+    unit_revenues = prod_yield * static_prices
+    unit_costs = cons_yield * static_costs
+    hourly_revenues = np.zeros(shape + (len(train.COMMODITIES),))
+    hourly_costs_total = np.zeros(shape + (len(train.COMMODITIES),))
+
+    for start in range(0, n, chunksize):
+        plants = slice(start, start + chunksize)
+        flow = biogas[plants]
+        margin = (unit_revenues[plants].sum(axis=2) - unit_costs[plants].sum(axis=2))[:, :, None]
+        margin = np.repeat(margin, HOURS, axis=2)
+        for c, series in hourly_prices:
+            margin += prod_yield[plants, :, c, None] * series[plants, None, :]
+        for c, series in hourly_costs:
+            margin -= cons_yield[plants, :, c, None] * series[plants, None, :]
+
+        running = margin > 0 if dispatch else np.ones(margin.shape, dtype=bool)
+        running &= flow[:, None, :] > 0
+        processed = np.where(running, flow[:, None, :], 0.0)
+        used[plants] = processed.sum(axis=2)
+        hours[plants] = running.sum(axis=2)
+        # hourly priced flows: yield x sum over hours of processed biogas x price
+        for c, series in hourly_prices:
+            hourly_revenues[plants, :, c] = prod_yield[plants, :, c] * np.einsum("pth,ph->pt", processed, series[plants])
+        for c, series in hourly_costs:
+            hourly_costs_total[plants, :, c] = cons_yield[plants, :, c] * np.einsum("pth,ph->pt", processed, series[plants])
+
+    production = prod_yield * used[:, :, None]
+    consumption = cons_yield * used[:, :, None]
+    revenues = unit_revenues * used[:, :, None] + hourly_revenues
+    fuel_costs = unit_costs * used[:, :, None] + hourly_costs_total
+
+    capex = assets._batch_capcosts(capacities, CO2split) * (1 - np.asarray(capsubsidy, dtype=float))[..., None]
+    batch = assets.calc_batch_cashflows(capex, production, consumption, revenues, fuel_costs, drate, taxrate)
+    return HourlyResult(batch, hours, used)
+
+
+def simulate_cashflows(assets,
+                       capsubsidy: float,
+                       drate: float,
+                       taxrate: float,
+                       CO2split: float,
+                       biometyield: float,
+                       heatgen: float,
+                       elecgen: float,
+                       biogas=None,
+                       prices=None,
+                       costs=None,
+                       dispatch: bool = True):
+    """CashFlows of the plant of assets from an hourly simulation, as Assets.calc_cashflows
+    biogas, prices and costs are hourly series as in simulate_hours"""
+    result = simulate_hours(assets, assets._capacity(), capsubsidy, drate, taxrate, CO2split,
+                            biometyield, heatgen, elecgen, biogas, prices, costs, dispatch)
+    return assets.batch_to_cashflows(result.batch)
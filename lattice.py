@@ -0,0 +1,142 @@
+import hashlib
+import numpy as np
+import os
+import pandas as pd
+import training as train
+
+# Precomputed results for every input combination the tutorial pages can produce.
+# Rebuild the artifact with `python lattice.py` after changing training.py, a lattice
+# built with other technologies, plant constants or cash flow rules is not loaded.
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lattice.npz")
+
+# capacities of Tutorial 1, subsidies of Tutorial 2 (and the session defaults
+# of Tutorials 2 and 3 divided by 100), discount rates of the three tutorials
+AXES = {"capacity": [1000000, 2700000, 5400000, 10800000],
+        "capsubsidy": [0, 0.001, 0.005, 0.1, 0.3, 0.5, 0.7, 0.9],
+        "drate": [0.05, 0.1]}
+
+# parameters shared by all tutorials
+FIXED = {"taxrate": 0.36,
+         "CO2split": 0.4,
+         "biometyield": 0.48,
+         "heatgen": 0.60,
+         "elecgen": 0.28}
+
+RESULTS = ["capex", "cf_wam", "cf_woam", "cflows", "cumcflows", "npv", "payback",
+           "payback_year", "discounted_payback_year"]
+
+DECIMALS = 9 # inputs are matched after rounding, pages rescale them by 100
+
+
+def fingerprint(assets):
+    """Hash of the registry and plant constants the results depend on"""
+    return hashlib.sha1(repr((assets.registry.digest, assets.lifetime, assets.amortisation_years,
+                              assets.horizon, assets.hours, assets.utilisation_factor,
+                              assets.LHV)).encode()).hexdigest()
+
+
+def build_lattice(path: str = PATH):
+    """Evaluates the full lattice in one calc_batch call and saves it to path"""
+    grid = np.meshgrid(*[np.asarray(values, dtype=float) for values in AXES.values()], indexing="ij")
+    shape = grid[0].shape
+    points = dict(zip(AXES, [axis.ravel() for axis in grid]))
+
+    assets = train.Assets(AXES["capacity"][0])
+    batch = assets.calc_batch(points["capacity"], points["capsubsidy"], points["drate"],
+                              *FIXED.values())
+
+    arrays = {name: np.asarray(values, dtype=float) for name, values in AXES.items()}
+    arrays["fixed"] = np.array(list(FIXED.values()), dtype=float)
+    arrays["periods"] = np.array([assets.lifetime, assets.amortisation_years, assets.horizon])
+    arrays["fingerprint"] = np.array(fingerprint(assets))
+    for name in RESULTS:
+        values = getattr(batch, name)
+        arrays[name] = values.reshape(shape + values.shape[1:])
+    np.savez_compressed(path, **arrays)
+    return path
+
+
+def is_default(table: pd.DataFrame, reference: np.ndarray):
+    """True when a user table leaves the reference prices or costs in place"""
+    if table.sum().sum() <= 0:
+        return True
+    return table.shape == reference.shape and np.array_equal(table.values, reference * 1000)
+
+
+class Lattice:
+    """Lookup of precomputed results by scenario inputs"""
+
+    def __init__(self, path: str = PATH):
+        with np.load(path) as data:
+            self.arrays = {name: data[name] for name in data.files}
+        self.index = {name: {round(float(value), DECIMALS): i for i, value in enumerate(self.arrays[name])}
+                      for name in AXES}
+        self.fixed = tuple(round(float(value), DECIMALS) for value in self.arrays["fixed"])
+        self.lifetime, self.amortisation_years, self.horizon = [int(p) for p in self.arrays["periods"]]
+        self.fingerprint = str(self.arrays["fingerprint"]) if "fingerprint" in self.arrays else None
+
+    def matches(self, assets):
+        """True when the lattice was built with the registry, periods and constants of assets,
+        and its first point still equals a live evaluation, which catches changes to the cash flow rules"""
+        if self.fingerprint != fingerprint(assets):
+            return False
+        if (self.lifetime, self.amortisation_years, self.horizon) != (assets.lifetime, assets.amortisation_years, assets.horizon):
+            return False
+        first = [self.arrays[name][0] for name in AXES]
+        batch = assets.calc_batch(first[0], *first[1:], *self.fixed)
+        return bool(np.allclose(batch.npv[0], self.arrays["npv"][(0,) * len(AXES)], rtol=1e-9))
+
+    def lookup(self,
+               capacity: float,
+               capsubsidy: float,
+               drate: float,
+               taxrate: float,
+               CO2split: float,
+               biometyield: float,
+               heatgen: float,
+               elecgen: float,
+               newprices: pd.DataFrame,
+               newcosts: pd.DataFrame):
+        """CashFlows for a lattice point, None when the inputs are not on the lattice"""
+        fixed = tuple(round(float(value), DECIMALS) for value in (taxrate, CO2split, biometyield, heatgen, elecgen))
+        if fixed != self.fixed:
+            return None
+        if not (is_default(newprices, train.PRICES) and is_default(newcosts, train.FCOSTS)):
+            return None
+        point = []
+        for name, value in zip(AXES, (capacity, capsubsidy, drate)):
+            i = self.index[name].get(round(float(value), DECIMALS))
+            if i is None:
+                return None
+            point.append(i)
+        # copies, so that callers cannot modify the lattice
+        values = {name: self.arrays[name][tuple(point)].copy() for name in RESULTS}
+
+        years = list(np.arange(0, self.lifetime + 1, 1))
+        technologies = train.TECHNOLOGIES
+        return train.CashFlows(
+            capex=pd.Series(values["capex"], index=technologies, name="capital_costs"),
+            annual=pd.DataFrame({"wam": values["cf_wam"], "woam": values["cf_woam"]}, index=technologies),
+            discounted=pd.DataFrame(values["cflows"], index=technologies, columns=years),
+            cumulative=pd.DataFrame(values["cumcflows"], index=technologies, columns=years),
+            npv=pd.Series(values["npv"], index=technologies, name=self.horizon),
+            payback=pd.Series(values["payback"], index=technologies),
+            payback_years=pd.DataFrame({"simple": values["payback_year"],
+                                        "discounted": values["discounted_payback_year"]},
+                                       index=technologies))
+
+
+def load_lattice(path: str = PATH):
+    """Loads the lattice, None if the artifact has not been built or is out of date,
+    the pages then compute every scenario live"""
+    if not os.path.exists(path):
+        return None
+    lattice = Lattice(path)
+    if not lattice.matches(train.Assets(AXES["capacity"][0])):
+        print(f"{path} is out of date and is not used, rebuild it with `python lattice.py`")
+        return None
+    return lattice
+
+
+if __name__ == "__main__":
+    print("Lattice written to", build_lattice())
@@ -0,0 +1,105 @@
+import numpy as np
+import os
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+import training as train
+from sweep import DEFAULTS, PARAMETERS, chunk_seeds, is_factor, key_hint, scale_table
+
+
+class MonteCarloResult(NamedTuple):
+    """Distributions of NPV and payback per technology
+    npv, payback: sample x technology arrays, payback is the capital costs over
+        the average discounted cash flow as in calc_batch
+    payback_year, discounted_payback_year: sample x technology payback years, inf if never reached
+    percentiles: technology x percentile NPV table (kEUR)
+    prob_positive: probability of a positive NPV by technology
+    payback_hist: histogram of the discounted payback years (bin x technology), the last bin
+        collects paybacks after the last bin or never reached"""
+    npv: np.ndarray
+    payback: np.ndarray
+    payback_year: np.ndarray
+    discounted_payback_year: np.ndarray
+    percentiles: pd.DataFrame
+    prob_positive: pd.Series
+    payback_hist: pd.DataFrame
+
+
+def sample_inputs(distributions: dict, n: int, rng: np.random.Generator):
+    """Draws n samples for every input
+    receives:
+    distributions: maps any of sweep.PARAMETERS, or "prices.<commodity>" and
+        "costs.<commodity>" (a factor on the reference column of calc_prices / calc_fcosts,
+        see sweep.scale_table),
+        to a constant or to a tuple (method, *args) of a numpy Generator,
+        e.g. ("triangular", 0.3, 0.4, 0.45) or ("normal", 0.48, 0.02)
+    Inputs without a distribution are fixed to sweep.DEFAULTS (factors to 1)"""
+    samples = {}
+    for name, spec in distributions.items():
+        if name not in PARAMETERS and not is_factor(name):
+            raise ValueError(f"Unknown uncertain input: {name}{key_hint(name)}")
+        if isinstance(spec, tuple):
+            method, *args = spec
+            samples[name] = getattr(rng, method)(*args, size=n)
+        else:
+            samples[name] = np.full(n, float(spec))
+    for name in PARAMETERS:
+        samples.setdefault(name, np.full(n, float(DEFAULTS[name])))
+    return samples
+
+
+def _run_chunk(task):
+    distributions, n, seed = task
+    rng = np.random.default_rng(seed)
+    samples = sample_inputs(distributions, n, rng)
+    assets = train.Assets(DEFAULTS["capacity"])
+    batch = assets.calc_batch(samples["capacity"],
+                              *[samples[name] for name in train.Scenario.parameters],
+                              prices=scale_table(assets.calc_prices().values, samples, "prices"),
+                              costs=scale_table(assets.calc_fcosts().values, samples, "costs"))
+    return batch.npv, batch.payback, batch.payback_year, batch.discounted_payback_year
+
+
+def run_montecarlo(distributions: dict,
+                   samples: int = 1000000,
+                   seed: int = 0,
+                   chunksize: int = 50000,
+                   processes: int = None,
+                   percentiles=(5, 25, 50, 75, 95),
+                   bins: int = 40):
+    """Monte Carlo evaluation of NPV and payback
+    receives:
+    distributions: uncertain inputs as in sample_inputs
+    samples: number of draws, evaluated in vectorized chunks of chunksize
+    seed: every chunk draws from its own stream spawned from this seed,
+        so results do not depend on the number of processes
+    processes: number of worker processes, defaults to all cores, 1 runs in-process
+    percentiles: NPV percentiles to report
+    bins: number of one-year-wide bins of the discounted payback years
+    When using several processes, call from under `if __name__ == "__main__":`"""
+    processes = processes or os.cpu_count() or 1
+    tasks = [(distributions, size, child) for _, size, child in chunk_seeds(samples, chunksize, seed)]
+
+    if processes == 1 or len(tasks) == 1:
+        chunks = [_run_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            chunks = list(pool.map(_run_chunk, tasks))
+
+    npv, payback, payback_year, discounted_payback_year = [np.concatenate(arrays) for arrays in zip(*chunks)]
+
+    table = pd.DataFrame(np.percentile(npv, percentiles, axis=0).transpose(),
+                         index=train.TECHNOLOGIES,
+                         columns=[f"P{p}" for p in percentiles])
+    prob_positive = pd.Series((npv > 0).mean(axis=0), index=train.TECHNOLOGIES)
+
+    # payback years after the last bin or never reached (inf) go to the last bin
+    edges = np.arange(bins + 1)
+    clipped = np.minimum(discounted_payback_year, bins)
+    counts = [np.histogram(clipped[:, i], bins=np.append(edges, np.inf))[0]
+              for i in range(len(train.TECHNOLOGIES))]
+    payback_hist = pd.DataFrame(np.array(counts).transpose(),
+                                index=[f"{b}-{b + 1}" for b in edges[:-1]] + [f">{bins}"],
+                                columns=train.TECHNOLOGIES)
+    return MonteCarloResult(npv, payback, payback_year, discounted_payback_year,
+                            table, prob_positive, payback_hist)
@@ -3,6 +3,7 @@ import os
 import pandas as pd
 import streamlit as st
 import training as train
+import tutorial_cache
 
 st.title("Choose a plant capacity")
 
@@ -28,84 +29,83 @@ with st.sidebar:
     st.markdown("[Imperial College London](https://www.imperial.ac.uk/)")
     st.sidebar.image("data/Imperial_logo.png")
 
-if "capacity" not in st.session_state:
-    st.session_state["capacity"] = 2700000
+with tutorial_cache.profiling():
+    if "capacity" not in st.session_state:
+        st.session_state["capacity"] = 2700000
 
 
-capacity = st.radio(
-    "Choose a capacity for the plant in cm / y",
-    (1000000, 2700000, 5400000, 10800000)
-)
+    capacity = st.radio(
+        "Choose a capacity for the plant in cm / y",
+        (1000000, 2700000, 5400000, 10800000)
+    )
 
-newprices = 0 * pd.DataFrame()
-newcosts = 0 * pd.DataFrame()
+    newprices = 0 * pd.DataFrame()
+    newcosts = 0 * pd.DataFrame()
 
-input_dict = {  "CAPEX Subsidy": 0.5,
-                "Dicount rate": 0.05,
-                "Taxation rate": 0.36,
-                "CO2 vol. perc. in biogas": 0.4,
-                "Biomethane yield": 0.48,
-                "CHP Thermal efficiency": 0.60,
-                "CHP electrical efficiency": 0.28
-                }
+    input_dict = {  "CAPEX Subsidy": 0.5,
+                    "Dicount rate": 0.05,
+                    "Taxation rate": 0.36,
+                    "CO2 vol. perc. in biogas": 0.4,
+                    "Biomethane yield": 0.48,
+                    "CHP Thermal efficiency": 0.60,
+                    "CHP electrical efficiency": 0.28
+                    }
 
-descriptors = ["Reduction in capital costs (perc.)",
-               "Value of time applied to future cash flows (perc.)",
-               "Apportioning of revenues going into taxes (perc.)",
-               "CO2 by volume in biogas (perc.)",
-               "Yield of biomethane from biogas (perc.)",
-               "Heat production from biogas in CHP (perc.)",
-               "Electricity production from biogas in CHP (perc.)"]
+    descriptors = ["Reduction in capital costs (perc.)",
+                   "Value of time applied to future cash flows (perc.)",
+                   "Apportioning of revenues going into taxes (perc.)",
+                   "CO2 by volume in biogas (perc.)",
+                   "Yield of biomethane from biogas (perc.)",
+                   "Heat production from biogas in CHP (perc.)",
+                   "Electricity production from biogas in CHP (perc.)"]
 
-data = np.array([value *100 for value in input_dict.values()]).reshape(1,-1).transpose()
-inputs = pd.DataFrame(data, index=descriptors, columns=["Data input"])
+    data = np.array([value *100 for value in input_dict.values()]).reshape(1,-1).transpose()
+    inputs = pd.DataFrame(data, index=descriptors, columns=["Data input"])
 
-submit = st.button("Submit")
-if submit:
-    st.session_state["capacity"] = capacity
-    st.write("The updated plant size is ", capacity, "cm / y")
+    submit = st.button("Submit")
+    if submit:
+        st.session_state["capacity"] = capacity
+        st.write("The updated plant size is ", capacity, "cm / y")
 
 
-assets = train.Assets(capacity)
+    cashflows = tutorial_cache.calc_cashflows(capacity,
+                                             inputs.iloc[0].values[0]/100, 
+                                             inputs.iloc[1].values[0]/100,
+                                             inputs.iloc[2].values[0]/100,
+                                             inputs.iloc[3].values[0]/100, 
+                                             inputs.iloc[4].values[0]/100, 
+                                             inputs.iloc[5].values[0]/100, 
+                                             inputs.iloc[6].values[0]/100, 
+                                             newprices,
+                                             newcosts    )
 
-cflows, cumcflows, npv = assets.calc_npv(inputs.iloc[0].values[0]/100, 
-                                        inputs.iloc[1].values[0]/100,
-                                        inputs.iloc[2].values[0]/100,
-                                        inputs.iloc[3].values[0]/100, 
-                                        inputs.iloc[4].values[0]/100, 
-                                        inputs.iloc[5].values[0]/100, 
-                                        inputs.iloc[6].values[0]/100, 
-                                        newprices,
-                                        newcosts    )
+    cflows, cumcflows, npv = cashflows.discounted, cashflows.cumulative, cashflows.npv
 
-st.write("Let's have a look at the main input parameters affecting the plants profitability, shown in the table below.")
+    st.write("Let's have a look at the main input parameters affecting the plants profitability, shown in the table below.")
 
-my_table = st.table(inputs)
+    my_table = st.table(inputs)
 
-chart_table = cumcflows.transpose()
+    chart_table = cumcflows.transpose()
 
-st.title("Cash flows")
-st.write("Let's check the plant profitability from the visualising the cumulative cash flows (k Euro/y) over time (years).")
+    st.title("Cash flows")
+    st.write("Let's check the plant profitability from the visualising the cumulative cash flows (k Euro/y) over time (years).")
 
-st.line_chart(chart_table, use_container_width=True)
+    st.line_chart(chart_table, use_container_width=True)
 
 
-st.title("Payback time")
-st.write("We can estimate the number of years to repay the initial investment, the so-called payback time.")
-payback = assets.calc_payback(inputs.iloc[0].values[0]/100, 
-                                            inputs.iloc[1].values[0]/100,
-                                            inputs.iloc[2].values[0]/100,
-                                            inputs.iloc[3].values[0]/100, 
-                                            inputs.iloc[4].values[0]/100, 
-                                            inputs.iloc[5].values[0]/100, 
-                                            inputs.iloc[6].values[0]/100, 
-                                            newprices,
-                                            newcosts    )
+    st.title("Payback time")
+    st.write("We can estimate the number of years to repay the initial investment, the so-called payback time.")
+    payback = cashflows.payback
 
-chart_data = payback.transpose()
-st.bar_chart(chart_data)
-st.write("The chart displays the payback time in number of years necessary to recover from the initial investment for each technology, AD, ADCHP, ADU, ADH2.")
+    chart_data = payback.transpose()
+    st.bar_chart(chart_data)
+    st.write("The chart displays the payback time in number of years necessary to recover from the initial investment for each technology, AD, ADCHP, ADU, ADH2.")
 
-st.title("Exercise")
-st.write("Change the capacity size to see the effects on the plant profitability, looking at cash flows and payback time.")
+    st.title("Internal rate of return")
+    st.write("The internal rate of return is the discount rate at which the net present value is zero, the investment is profitable when it exceeds the discount rate.")
+    irr = train.Assets(capacity).calc_cashflows_irr(cashflows)
+    st.table((100 * irr).round(1).to_frame("Internal rate of return (perc.)"))
+    st.write("An empty value means that the net present value does not change sign, there is no internal rate of return.")
 
+    st.title("Exercise")
+    st.write("Change the capacity size to see the effects on the plant profitability, looking at cash flows, payback time and internal rate of return.")
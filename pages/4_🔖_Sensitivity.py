@@ -0,0 +1,88 @@
+import altair as alt
+import numpy as np
+import pandas as pd
+import streamlit as st
+import training as train
+import tutorial_cache
+
+st.title("Find the drivers of profitability")
+
+st.write("As a reminder, in the figure, you can see displayed the alternative configurations we will consider.")
+st.write("AD is basic anaerobic digestion, ADCHP includes co-generation, ADU is membrane-based biogas upgrading, ADH2 is the methanation process.")
+
+st.image("data/schematic.png")
+
+with st.sidebar:
+    st.sidebar.image("data/cooce_logo.png")
+    st.write("Harnessing  potential of biogenic CO2 capture for Circular Economy")
+    st.write("\n")
+    st.write("\n")
+    st.write("This application can help assess options to valorise biogas")
+    st.markdown("Designed by Dr. Sara Giarola")
+    st.markdown("Co-designed by Dr. Rocio Diaz-Chavez")
+    st.markdown("Contacts: Dr. Sara Giarola (s.giarola10@imperial.ac.uk), Dr. Rocio Diaz-Chavez (r.diaz-chavez@imperial.ac.uk)")
+    st.markdown("[Imperial College London](https://www.imperial.ac.uk/)")
+    st.sidebar.image("data/Imperial_logo.png")
+
+with tutorial_cache.profiling():
+    if "capacity" not in st.session_state:
+        st.session_state["capacity"] = 2700000
+
+    if "subsidies" not in st.session_state:
+        st.session_state["subsidies"] = 0.5
+
+    st.write("In the previous tutorials we changed one input at a time to see its effect on the plant profitability.")
+    st.write("Here every input, price and cost is moved up and down around the scenario below, to rank the inputs by their effect on the net present value.")
+
+    subsidies = st.session_state["subsidies"]
+
+    input_dict = {  "CAPEX Subsidy": subsidies / 100,
+                    "Dicount rate": 0.05,
+                    "Taxation rate": 0.36,
+                    "CO2 vol. perc. in biogas": 0.4,
+                    "Biomethane yield": 0.48,
+                    "CHP Thermal efficiency": 0.60,
+                    "CHP electrical efficiency": 0.28
+                    }
+
+    descriptors = ["Reduction in capital costs (perc.)",
+                   "Value of time applied to future cash flows (perc.)",
+                   "Apportioning of revenues going into taxes (perc.)",
+                   "CO2 by volume in biogas (perc.)",
+                   "Yield of biomethane from biogas (perc.)",
+                   "Heat production from biogas in CHP (perc.)",
+                   "Electricity production from biogas in CHP (perc.)"]
+
+    data = np.array([value *100 for value in input_dict.values()]).reshape(1,-1).transpose()
+    inputs = pd.DataFrame(data, index=descriptors, columns=["Data input"])
+
+    st.write("Remember that the simulations are valid for a plant capacity of ", st.session_state["capacity"], "cm / y")
+    st.table(inputs)
+
+    technology = st.radio("Choose a technology", train.TECHNOLOGIES, horizontal=True)
+    step = st.radio("Choose the change applied to each input (perc.)", (5, 10, 20), index=1, horizontal=True)
+
+    result = tutorial_cache.calc_sensitivity(st.session_state["capacity"], step / 100,
+                                             *[value / 100 for value in inputs["Data input"].values])
+
+    st.title("Tornado chart")
+    st.write("Each bar spans the net present value (k Euro) obtained decreasing and increasing one input, the most influential inputs are at the top.")
+
+    tornado = result.tornado(technology, top=15).reset_index(names="input")
+    base = result.base[technology]
+    bars = alt.Chart(tornado).mark_bar().encode(
+        x=alt.X("low:Q", title="Net present value (k Euro)"),
+        x2="high:Q",
+        y=alt.Y("input:N", sort=None, title=None),
+        color=alt.condition(alt.datum.high > alt.datum.low, alt.value("#4c78a8"), alt.value("#e45756")),
+        tooltip=["input", "low", "high"])
+    rule = alt.Chart(pd.DataFrame({"base": [base]})).mark_rule(color="black").encode(x="base:Q")
+    st.altair_chart(bars + rule, use_container_width=True)
+    st.write("Blue bars grow with the input, red bars decrease with it. The black line is the net present value of the scenario, ", round(base, 1), "k Euro.")
+
+    st.title("Elasticities")
+    st.write("The elasticity is the relative change of the net present value over the relative change of an input.")
+    st.dataframe(result.elasticity.loc[tornado["input"]].round(3))
+
+    st.title("Exercise")
+    st.write("Change the subsidisation level in 'Tutorial n.2' or the capacity in 'Tutorial n.1' and check whether the ranking of the inputs changes.")
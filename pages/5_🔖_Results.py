@@ -0,0 +1,58 @@
+import numpy as np
+import os
+import pandas as pd
+import streamlit as st
+import tutorial_cache
+
+st.title("Explore large studies")
+
+with st.sidebar:
+    st.sidebar.image("data/cooce_logo.png")
+    st.write("Harnessing  potential of biogenic CO2 capture for Circular Economy")
+    st.write("\n")
+    st.write("\n")
+    st.write("This application can help assess options to valorise biogas")
+    st.markdown("Designed by Dr. Sara Giarola")
+    st.markdown("Co-designed by Dr. Rocio Diaz-Chavez")
+    st.markdown("Contacts: Dr. Sara Giarola (s.giarola10@imperial.ac.uk), Dr. Rocio Diaz-Chavez (r.diaz-chavez@imperial.ac.uk)")
+    st.markdown("[Imperial College London](https://www.imperial.ac.uk/)")
+    st.sidebar.image("data/Imperial_logo.png")
+
+with tutorial_cache.profiling():
+    st.write("Sweeps and Monte Carlo studies can evaluate millions of scenarios for the four configurations.")
+    st.write("Their results are saved in a result store, see store.py, and only the scenarios shown below are read from disk.")
+
+    path = st.text_input("Result store folder", "data/results")
+
+    if not os.path.exists(os.path.join(path, "index.json")):
+        st.write("No result store in this folder yet. A store can be written from Python, for instance:")
+        st.code('import numpy as np, sweep, store\n'
+                'grid = sweep.make_grid(capacity=np.linspace(1e5, 1e7, 1000), CO2split=np.linspace(0.3, 0.45, 16))\n'
+                'store.write_store("data/results", store.sweep_chunks(grid), sweep.grid_size(grid))')
+    else:
+        results = tutorial_cache.open_result_store(path)
+        st.write("The store holds ", len(results), "scenarios.")
+        if not len(results):
+            st.write("This result store is empty, write scenarios to it to explore them here.")
+        else:
+            technology = st.radio("Choose a technology", results.technologies, horizontal=True)
+            t = results.technology(technology)
+
+            st.title("Net present value")
+            last_scenario = len(results) - 1
+            if last_scenario:
+                first, last = st.slider("Scenarios", 0, last_scenario, (0, min(last_scenario, 99999)))
+            else:
+                first, last = 0, 0
+            # at most 100000 evenly spaced scenarios are read for the histogram
+            stride = max(1, -(-(last + 1 - first) // 100000))
+            npv = np.asarray(results.npv[first:last + 1:stride, t])
+            counts, edges = np.histogram(npv, bins=40)
+            histogram = pd.DataFrame({"scenarios": counts}, index=[f"{edge:.0f}" for edge in edges[:-1]])
+            st.bar_chart(histogram)
+            st.write("Share of scenarios with a positive net present value: ", round(100 * float((npv > 0).mean()), 1), "%")
+
+            st.title("Cash flows of a scenario")
+            scenario = st.number_input("Scenario", min_value=0, max_value=last_scenario, value=min(first, last_scenario))
+            st.table(results.scenarios(slice(scenario, scenario + 1)).transpose())
+            st.line_chart(results.cashflows(scenario).transpose(), use_container_width=True)
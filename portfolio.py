@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import training as train
+from sweep import DEFAULTS, is_factor, key_hint, scenario_parameters
+
+# Sites file columns
+#   site: optional identifier, the row number otherwise
+#   capacity: biogas capacity (cm/y), required
+#   capsubsidy, drate, taxrate, CO2split, biometyield, heatgen, elecgen: optional, sweep.DEFAULTS otherwise
+#   price.<commodity>, cost.<commodity>: optional local price / fuel cost for every technology
+#   price.<technology>.<commodity>, cost.<technology>.<commodity>: optional, for one technology
+# Local prices and costs are in euro / kWh (CO2 and H2 in euro / t), as in the Tutorial 3 tables.
+
+
+def local_tables(sites: pd.DataFrame, assets, prices=None, costs=None):
+    """Site x technology x commodity prices and costs (keuro / kWh)
+    prices, costs: tables the local values apply to, the registry references by default
+    returns these tables when the sites have no local values"""
+    prices = assets.registry.prices if prices is None else prices
+    costs = assets.registry.costs if costs is None else costs
+    factors = [column for column in sites.columns if is_factor(column)]
+    if factors:
+        raise ValueError(f"Unknown column: {factors[0]}{key_hint(factors[0])}")
+    tables = []
+    for prefix, reference in (("price.", prices), ("cost.", costs)):
+        columns = sorted([column for column in sites.columns if column.startswith(prefix)],
+                         key=lambda column: column.count("."))
+        if not columns:
+            tables.append(reference)
+            continue
+        table = np.repeat(reference[None, :, :], len(sites), axis=0)
+        # commodity-wide columns first, so that technology columns override them
+        for column in columns:
+            *technology, commodity = column[len(prefix):].split(".")
+            if (commodity not in train.COMMODITIES or len(technology) > 1
+                    or technology and technology[0] not in assets.technologies):
+                raise ValueError(f"Unknown column: {column}")
+            c = train.COMMODITIES.index(commodity)
+            rows = assets.technologies.index(technology[0]) if technology else slice(None)
+            values = sites[column].values.astype(float) / 1000
+            # empty cells keep the reference value
+            known = ~np.isnan(values)
+            table[known, rows, c] = values[known] if technology else values[known, None]
+        tables.append(table)
+    return tables
+
+
+def evaluate_sites(sites: pd.DataFrame, assets=None, prices=None, costs=None):
+    """Per-site results and totals for one chunk of the sites file
+    prices, costs: keuro / kWh tables the local values apply to, see local_tables
+    returns (per-site DataFrame, dictionary of technology arrays summed over the chunk)"""
+    assets = assets or train.Assets(DEFAULTS["capacity"])
+    parameters = scenario_parameters(sites)
+    prices, costs = local_tables(sites, assets, prices, costs)
+    batch = assets.calc_batch(sites["capacity"].values, *parameters, prices=prices, costs=costs)
+
+    technologies = assets.technologies
+    index = sites["site"].values if "site" in sites else sites.index.values
+    results = pd.DataFrame({"site": index})
+    for i, tech in enumerate(technologies):
+        results[f"npv_{tech}"] = batch.npv[:, i]
+        results[f"capex_{tech}"] = batch.capex[:, i]
+        results[f"payback_{tech}"] = batch.payback[:, i]
+        results[f"payback_year_{tech}"] = batch.discounted_payback_year[:, i]
+    results["best"] = np.array(technologies)[np.argmax(batch.npv, axis=1)]
+
+    totals = {"sites": len(sites),
+              "npv": batch.npv.sum(axis=0),
+              "capex": batch.capex.sum(axis=0),
+              "positive_npv": (batch.npv > 0).sum(axis=0),
+              "best": np.bincount(np.argmax(batch.npv, axis=1), minlength=len(technologies)),
+              "biomethane": batch.production[:, :, train.Commodity.biomethane].sum(axis=0),
+              "CO2_produced": batch.production[:, :, train.Commodity.CO2].sum(axis=0),
+              "CO2_consumed": batch.consumption[:, :, train.Commodity.CO2].sum(axis=0)}
+    return results, totals
+
+
+def run_portfolio(sites_file: str, output: str = None, chunksize: int = 50000, assets=None):
+    """Streams a sites file in chunks and evaluates every site against every technology
+    receives:
+    sites_file: CSV file, see the columns above
+    output: optional CSV file for the per-site results, written chunk by chunk
+    chunksize: sites held in memory at once
+    returns fleet aggregates by technology:
+    npv, capex (kEUR), positive_npv and best (number of sites),
+    biomethane (kWh/y), CO2_produced and CO2_consumed (t/y)"""
+    assets = assets or train.Assets(DEFAULTS["capacity"])
+    fleet = None
+    for i, sites in enumerate(pd.read_csv(sites_file, chunksize=chunksize)):
+        results, totals = evaluate_sites(sites, assets)
+        if output is not None:
+            results.to_csv(output, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        if fleet is None:
+            fleet = totals
+        else:
+            fleet = {name: fleet[name] + value for name, value in totals.items()}
+
+    if fleet is None:
+        raise ValueError(f"No sites in {sites_file}")
+    aggregates = pd.DataFrame({name: value for name, value in fleet.items() if name != "sites"},
+                              index=assets.technologies)
+    aggregates.attrs["sites"] = fleet["sites"]
+    return aggregates
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from typing import NamedTuple
+import training as train
+from sweep import DEFAULTS, PARAMETERS, chunk_seeds
+
+# Stochastic price paths over the plant lifetime. Each commodity follows a path of
+# factors on its reference price and fuel cost (1 in year 0), the commodities of a
+# path are correlated through their yearly shocks.
+#   geometric random walk: {"model": "gbm", "mu": 0.01, "sigma": 0.1}
+#   mean-reverting log factor: {"model": "ou", "sigma": 0.15, "kappa": 0.3, "mean": 0.0}
+MODELS = ["gbm", "ou"]
+
+
+class PricePathResult(NamedTuple):
+    """NPV and payback distributions over price paths
+    npv, payback_year: path x technology, NPV at the horizon (kEUR) and discounted payback year
+    risk: technology x metric table with the mean NPV, the alpha quantile of the NPV (VaR, as
+        an NPV level), the expected shortfall (mean NPV below that quantile), the probability of
+        a positive NPV and the probability of a discounted payback within each number of years"""
+    npv: np.ndarray
+    payback_year: np.ndarray
+    risk: pd.DataFrame
+
+
+def simulate_paths(models: dict, correlation, n: int, years: int, rng: np.random.Generator):
+    """Correlated factor paths, {commodity: path x year} with years values and 1 in year 0
+    receives:
+    models: {commodity: model parameters}, see the models above
+    correlation: correlation matrix of the yearly shocks in the order of models, None if independent"""
+    k = len(models)
+    shocks = rng.standard_normal((n, years - 1, k))
+    if correlation is not None:
+        shocks = shocks @ np.linalg.cholesky(np.asarray(correlation, dtype=float)).transpose()
+    paths = {}
+    for i, (commodity, model) in enumerate(models.items()):
+        if commodity not in train.COMMODITIES:
+            raise ValueError(f"Unknown commodity: {commodity}")
+        sigma = model.get("sigma", 0.0)
+        logs = np.zeros((n, years))
+        if model.get("model", "gbm") == "gbm":
+            steps = model.get("mu", 0.0) - sigma**2 / 2 + sigma * shocks[:, :, i]
+            logs[:, 1:] = np.cumsum(steps, axis=1)
+        elif model["model"] == "ou":
+            kappa, mean = model.get("kappa", 0.0), model.get("mean", 0.0)
+            for year in range(1, years):
+                logs[:, year] = logs[:, year - 1] + kappa * (mean - logs[:, year - 1]) + sigma * shocks[:, year - 1, i]
+        else:
+            raise ValueError(f"Unknown price model {model['model']}, expected one of {MODELS}")
+        paths[commodity] = np.exp(logs)
+    return paths
+
+
+def risk_table(npv: np.ndarray, payback_year: np.ndarray, alpha: float, within, technologies: list):
+    """Risk metrics by technology, see PricePathResult"""
+    var = np.quantile(npv, alpha, axis=0)
+    tail = npv <= var
+    table = pd.DataFrame({"mean": npv.mean(axis=0),
+                          f"VaR{alpha:.0%}": var,
+                          f"ES{alpha:.0%}": (npv * tail).sum(axis=0) / tail.sum(axis=0),
+                          "prob_positive": (npv > 0).mean(axis=0)},
+                         index=technologies)
+    for years in within:
+        table[f"payback<={years}y"] = (payback_year <= years).mean(axis=0)
+    return table
+
+
+def run_price_paths(models: dict,
+                    correlation=None,
+                    paths: int = 100000,
+                    seed: int = 0,
+                    chunksize: int = 5000,
+                    alpha: float = 0.05,
+                    within=(5, 10, 15, 20),
+                    assets=None,
+                    **values):
+    """Runs correlated price paths through Assets.calc_trajectories
+    receives:
+    models, correlation: price paths as in simulate_paths, the factors apply to both the
+        price and the fuel cost of each commodity
+    paths: number of paths, simulated and evaluated in chunks of chunksize paths, so memory
+        only depends on chunksize (about 20 kB per path with the 40-year lifetime)
+    seed: every chunk draws from its own stream spawned from this seed
+    alpha: tail probability of the value-at-risk and expected shortfall
+    within: payback horizons (years) of the payback probabilities
+    values: any of sweep.PARAMETERS, sweep.DEFAULTS otherwise
+    returns a PricePathResult"""
+    unknown = set(values) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {sorted(unknown)}")
+    inputs = {name: values.get(name, DEFAULTS[name]) for name in PARAMETERS}
+    assets = assets or train.Assets(inputs["capacity"])
+    years = assets.lifetime + 1
+
+    npv = np.empty((paths, len(assets.registry)))
+    payback_year = np.empty((paths, len(assets.registry)))
+    for start, size, child in chunk_seeds(paths, chunksize, seed):
+        factors = simulate_paths(models, correlation, size, years, np.random.default_rng(child))
+        result = assets.calc_trajectories(np.full(size, float(inputs["capacity"])),
+                                          *[inputs[name] for name in train.Scenario.parameters],
+                                          price_factors=factors, cost_factors=factors)
+        npv[start:start + size] = result.npv
+        payback_year[start:start + size] = result.discounted_payback_year
+    return PricePathResult(npv, payback_year, risk_table(npv, payback_year, alpha, within, assets.technologies))
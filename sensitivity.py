@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from typing import NamedTuple
+import training as train
+from sweep import DEFAULTS
+
+
+class SensitivityResult(NamedTuple):
+    """Local sensitivity of the NPV around a base scenario
+    base: NPV by technology of the base scenario
+    low, high: input x technology NPV with the input decreased / increased by the step
+    elasticity: input x technology relative change of NPV over relative change of the input
+        (central difference), undefined where the base NPV is zero"""
+    base: pd.Series
+    low: pd.DataFrame
+    high: pd.DataFrame
+    elasticity: pd.DataFrame
+
+    def tornado(self, technology: str, top: int = None):
+        """Low and high NPV of a technology by input, largest swing first"""
+        table = pd.DataFrame({"low": self.low[technology], "high": self.high[technology]})
+        swing = (table["high"] - table["low"]).abs()
+        table = table.loc[swing.sort_values(ascending=False).index]
+        return table if top is None else table.head(top)
+
+
+def calc_sensitivity(assets=None,
+                     step: float = 0.1,
+                     prices=None,
+                     costs=None,
+                     **values):
+    """Perturbs every scenario parameter and every price and cost cell up and down
+    receives:
+    assets: Assets of the base plant, capacity from sweep.DEFAULTS by default
+    step: relative perturbation of each input
+    prices, costs: base tables (keuro / kWh) as in Assets.calc_batch, the references by default
+    values: base values of the Scenario parameters, sweep.DEFAULTS otherwise
+    Inputs are named after the Scenario parameters and price.<technology>.<commodity> /
+    cost.<technology>.<commodity>; zero-valued cells cannot be perturbed relatively and are left out.
+    All perturbations are evaluated in one calc_batch call"""
+    assets = assets or train.Assets(DEFAULTS["capacity"])
+    unknown = set(values) - set(train.Scenario.parameters)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {sorted(unknown)}")
+    base = np.array([float(values.get(name, DEFAULTS[name])) for name in train.Scenario.parameters])
+    tables = [np.array(assets.registry.prices if prices is None else prices, dtype=float),
+              np.array(assets.registry.costs if costs is None else costs, dtype=float)]
+
+    # inputs: (name, parameter index or None, table index, cell)
+    inputs = [(name, i, None, None) for i, name in enumerate(train.Scenario.parameters) if base[i] != 0]
+    for t, prefix in enumerate(("price", "cost")):
+        for tech, commodity in zip(*np.nonzero(tables[t])):
+            name = f"{prefix}.{assets.technologies[tech]}.{train.COMMODITIES[commodity]}"
+            inputs.append((name, None, t, (tech, commodity)))
+
+    # row 0 is the base scenario, then every input down and up
+    n = 1 + 2 * len(inputs)
+    parameters = np.repeat(base[None, :], n, axis=0)
+    batch_tables = [np.repeat(table[None, :, :], n, axis=0) for table in tables]
+    for k, (name, i, t, cell) in enumerate(inputs):
+        for row, factor in ((1 + 2 * k, 1 - step), (2 + 2 * k, 1 + step)):
+            if i is not None:
+                parameters[row, i] *= factor
+            else:
+                batch_tables[t][(row,) + cell] *= factor
+
+    capacity = assets.assets["capacity"].values[0]
+    npv = assets.calc_batch(np.full(n, capacity), *parameters.transpose(),
+                            prices=batch_tables[0], costs=batch_tables[1]).npv
+    names = [name for name, *_ in inputs]
+    low = pd.DataFrame(npv[1::2], index=names, columns=assets.technologies)
+    high = pd.DataFrame(npv[2::2], index=names, columns=assets.technologies)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        elasticity = (high - low) / (2 * step * npv[0])
+    return SensitivityResult(pd.Series(npv[0], index=assets.technologies), low, high,
+                             elasticity.replace([np.inf, -np.inf], np.nan))
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import json
+import math
+import numpy as np
+import pandas as pd
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+import training as train
+from portfolio import local_tables
+from sweep import DEFAULTS, PARAMETERS, key_hint, scenario_parameters
+
+# Local JSON HTTP service over training.Assets.
+#   python service.py --port 8765
+#   curl -d '{"capacity": 2700000, "capsubsidy": 0.3}' localhost:8765/npv
+#   curl 'localhost:8765/payback?capacity=2700000&cost.H2=1500'
+#   curl 'localhost:8765/irr?capacity=2700000'
+# A query has the keys of a portfolio sites file: capacity, the Scenario parameters
+# (sweep.DEFAULTS when missing) and price./cost. keys in euro / kWh (CO2 and H2 in euro / t).
+# POST bodies are a query or a list of queries, GET takes the query string.
+# Concurrent queries are evaluated together in one calc_batch call on a worker thread.
+ENDPOINTS = ["npv", "cashflows", "payback", "irr", "production", "consumption"]
+
+
+def parse_query(query: dict, technologies: list = train.TECHNOLOGIES):
+    """Validated query as a hashable tuple of (key, float) pairs
+    price. and cost. keys are price.<commodity> or price.<technology>.<commodity>"""
+    if "capacity" not in query:
+        raise ValueError("capacity is required")
+    items = []
+    for key, value in query.items():
+        kind, *names = key.split(".")
+        local = (kind in ("price", "cost") and len(names) in (1, 2) and names[-1] in train.COMMODITIES
+                 and (len(names) == 1 or names[0] in technologies))
+        if key not in PARAMETERS and not local:
+            raise ValueError(f"Unknown input: {key}{key_hint(key)}")
+        items.append((key, float(value)))
+    return tuple(sorted(items))
+
+
+def evaluate_queries(assets, queries: list):
+    """Vectorized evaluation of parsed queries, returns one dictionary of arrays per query"""
+    sites = pd.DataFrame([dict(query) for query in queries])
+    parameters = scenario_parameters(sites)
+    prices, costs = local_tables(sites, assets)
+    batch = assets.calc_batch(sites["capacity"].values, *parameters, prices=prices, costs=costs)
+    irr = assets.calc_batch_irr(batch.capex, batch.cf_wam, batch.cf_woam)
+    columns = dict(batch._asdict(), irr=irr.rate, irr_roots=irr.roots)
+    # copies, so that cached rows do not keep the whole batch alive
+    return [{name: np.array(values[i]) for name, values in columns.items()}
+            for i in range(len(queries))]
+
+
+def _list(values):
+    """JSON-ready list, infinite or undefined values become null"""
+    return [value if math.isfinite(value) else None for value in values.tolist()]
+
+
+def format_result(endpoint: str, result: dict, technologies: list):
+    """Response body of an endpoint for one evaluated query"""
+    def by_technology(values):
+        return dict(zip(technologies, _list(values)))
+
+    def by_commodity(table):
+        return {tech: dict(zip(train.COMMODITIES, _list(row))) for tech, row in zip(technologies, table)}
+
+    if endpoint == "npv":
+        return {"npv": by_technology(result["npv"])}
+    if endpoint == "payback":
+        return {"payback": by_technology(result["payback"]),
+                "payback_years": {"simple": by_technology(result["payback_year"]),
+                                  "discounted": by_technology(result["discounted_payback_year"])}}
+    if endpoint == "irr":
+        # roots: 0 without IRR (null), more than 1 when the lowest of several IRRs is reported
+        return {"irr": by_technology(result["irr"]),
+                "roots": dict(zip(technologies, result["irr_roots"].tolist()))}
+    if endpoint == "cashflows":
+        return {"capex": by_technology(result["capex"]),
+                "annual": {"wam": by_technology(result["cf_wam"]), "woam": by_technology(result["cf_woam"])},
+                "discounted": {tech: _list(row) for tech, row in zip(technologies, result["cflows"])},
+                "cumulative": {tech: _list(row) for tech, row in zip(technologies, result["cumcflows"])},
+                "npv": by_technology(result["npv"])}
+    if endpoint in ("production", "consumption"):
+        return {endpoint: by_commodity(result[endpoint])}
+    raise KeyError(endpoint)
+
+
+class Batcher:
+    """Collects concurrent queries and evaluates them in vectorized batches
+    receives:
+    max_batch: queries evaluated at once, a full batch is evaluated immediately
+    max_delay: seconds a query waits for others before its batch is evaluated
+    workers: threads evaluating batches off the event loop
+    cache_size: evaluated queries kept, least recently used are evicted first"""
+
+    def __init__(self, max_batch: int = 1024, max_delay: float = 0.002, workers: int = 2, cache_size: int = 65536):
+        self.assets = train.Assets(DEFAULTS["capacity"])
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.cache = train.LRUCache(maxsize=cache_size)
+        self.pending = {}
+        self.timer = None
+        self.batches = 0
+        self.evaluated = 0
+
+    async def evaluate(self, query: tuple):
+        found, result = self.cache.lookup(query)
+        if found:
+            return result
+        loop = asyncio.get_running_loop()
+        # identical queries waiting in the same batch share one evaluation
+        if query not in self.pending:
+            self.pending[query] = loop.create_future()
+        future = self.pending[query]
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_delay, self.flush)
+        return await asyncio.shield(future)
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        asyncio.ensure_future(self.run(pending))
+
+    async def run(self, pending: dict):
+        queries = list(pending)
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.pool, evaluate_queries, self.assets, queries)
+        except Exception as error:
+            # a failing query only fails its own callers, the others are evaluated one by one
+            results = [error] if len(queries) == 1 else [await self.evaluate_one(query) for query in queries]
+        self.batches += 1
+        self.evaluated += len(queries)
+        for query, result in zip(queries, results):
+            if isinstance(result, Exception):
+                pending[query].set_exception(result)
+            else:
+                self.cache.put(query, result)
+                pending[query].set_result(result)
+
+    async def evaluate_one(self, query: tuple):
+        """Result of a single query, or the exception it raised"""
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.pool, evaluate_queries,
+                                                                       self.assets, [query])
+            return results[0]
+        except Exception as error:
+            return error
+
+    def stats(self):
+        return {"batches": self.batches, "evaluated": self.evaluated, "cache": self.cache.info()}
+
+
+class Service:
+    """Minimal HTTP/1.1 server with keep-alive connections, see the usage above"""
+
+    def __init__(self, batcher: Batcher = None):
+        self.batcher = batcher or Batcher()
+
+    async def respond(self, method: str, target: str, body: bytes):
+        """(status, JSON-ready payload) for a request"""
+        url = urlsplit(target)
+        endpoint = url.path.strip("/")
+        if method == "GET" and endpoint == "health":
+            return 200, {"status": "ok"}
+        if method == "GET" and endpoint == "stats":
+            return 200, self.batcher.stats()
+        if endpoint not in ENDPOINTS:
+            return 404, {"error": f"Unknown endpoint: {url.path}"}
+        if method == "GET":
+            payload = dict(parse_qsl(url.query))
+        elif method == "POST":
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                return 400, {"error": "Invalid JSON"}
+        else:
+            return 405, {"error": f"Method not allowed: {method}"}
+
+        many = isinstance(payload, list)
+        try:
+            technologies = self.batcher.assets.technologies
+            queries = [parse_query(query, technologies) for query in (payload if many else [payload])]
+        except (TypeError, ValueError, AttributeError) as error:
+            return 400, {"error": str(error)}
+        results = await asyncio.gather(*[self.batcher.evaluate(query) for query in queries])
+        bodies = [format_result(endpoint, result, technologies) for result in results]
+        return 200, bodies if many else bodies[0]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload = await self.respond(method, target, body)
+                except Exception as error:
+                    status, payload = 500, {"error": str(error)}
+                content = json.dumps(payload).encode()
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n"
+                             % (status, REASONS[status], len(content), b"Connection: close\r\n" if close else b"")
+                             + content)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+
+REASONS = {200: b"OK", 400: b"Bad Request", 404: b"Not Found", 405: b"Method Not Allowed",
+           500: b"Internal Server Error"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON HTTP service for training.Assets")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=1024, help="queries evaluated at once")
+    parser.add_argument("--max-delay", type=float, default=0.002, help="seconds a query waits for a batch")
+    parser.add_argument("--workers", type=int, default=2, help="threads evaluating batches")
+    parser.add_argument("--cache-size", type=int, default=65536, help="evaluated queries kept")
+    args = parser.parse_args(argv)
+
+    service = Service(Batcher(args.max_batch, args.max_delay, args.workers, args.cache_size))
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
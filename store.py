@@ -0,0 +1,143 @@
+import json
+import numpy as np
+import os
+import pandas as pd
+import training as train
+from montecarlo import sample_inputs
+from sweep import chunk_seeds, evaluate_batch, grid_points, grid_size
+
+# Memory-mapped result stores for large sweeps and Monte Carlo runs.
+# A store is a directory with a small index.json and one .npy file per array:
+#   inputs/<name>.npy   scenario          input columns (sweep.PARAMETERS and factors)
+#   npv.npy, payback.npy scenario x technology
+#   cumcflows.npy        scenario x technology x year, cumulative discounted cash flows
+# Opening a store maps the files without reading them, slices are read on access and
+# the operating system shares the pages between processes.
+#   write_store("data/sweep", sweep_chunks(grid, 50000), grid_size(grid))
+#   results = open_store("data/sweep"); results.npv[1000:2000, 0]
+ARRAYS = ["npv", "payback", "cumcflows"]
+INDEX = "index.json"
+
+
+def sweep_chunks(grid: dict, chunksize: int = 50000):
+    """Lazily yields the input columns of a sweep grid, chunk by chunk"""
+    total = grid_size(grid)
+    for start in range(0, total, chunksize):
+        yield grid_points(grid, start, min(start + chunksize, total))
+
+
+def montecarlo_chunks(distributions: dict, samples: int, seed: int = 0, chunksize: int = 50000):
+    """Lazily yields Monte Carlo input samples, with the chunk streams of montecarlo.run_montecarlo"""
+    for _, size, child in chunk_seeds(samples, chunksize, seed):
+        yield sample_inputs(distributions, size, np.random.default_rng(child))
+
+
+def write_store(path: str, chunks, size: int, prices=None, costs=None, dtype=np.float32):
+    """Evaluates chunks of inputs and writes the results to a store at path
+    receives:
+    chunks: iterable of input column dictionaries, e.g. sweep_chunks or montecarlo_chunks
+    size: total number of scenarios, the arrays are allocated on disk upfront
+    prices, costs: keuro / kWh tables passed to Assets.calc_batch
+    dtype: type of the cash flow tensor, float32 halves its size (NPV and payback stay float64)
+    returns the open store"""
+    os.makedirs(os.path.join(path, "inputs"), exist_ok=True)
+    # a rewritten store loses its index first, so an interrupted write leaves an incomplete store;
+    # old arrays are unlinked rather than truncated, stores already open keep reading them
+    for name in [INDEX] + [f"{name}.npy" for name in ARRAYS]:
+        if os.path.exists(os.path.join(path, name)):
+            os.remove(os.path.join(path, name))
+    for name in os.listdir(os.path.join(path, "inputs")):
+        os.remove(os.path.join(path, "inputs", name))
+    assets = train.Assets(1)
+    years = assets.lifetime + 1
+    technologies = len(assets.technologies)
+    shapes = {"npv": ((size, technologies), np.float64),
+              "payback": ((size, technologies), np.float64),
+              "cumcflows": ((size, technologies, years), dtype)}
+    arrays = {name: np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+",
+                                              dtype=kind, shape=shape)
+              for name, (shape, kind) in shapes.items()}
+    inputs = {}
+    position = 0
+    for points in chunks:
+        n = len(points["capacity"])
+        if position + n > size:
+            raise ValueError(f"More than {size} scenarios")
+        if not inputs:
+            inputs = {name: np.lib.format.open_memmap(os.path.join(path, "inputs", f"{name}.npy"),
+                                                      mode="w+", dtype=np.float64, shape=(size,))
+                      for name in points}
+        batch = evaluate_batch(points, prices, costs)
+        for name, values in points.items():
+            inputs[name][position:position + n] = values
+        for name in ARRAYS:
+            arrays[name][position:position + n] = getattr(batch, name)
+        position += n
+
+    for array in list(arrays.values()) + list(inputs.values()):
+        array.flush()
+    index = {"size": position,
+             "technologies": assets.technologies,
+             "years": years,
+             "inputs": list(inputs),
+             "arrays": {name: {"shape": list(shape), "dtype": np.dtype(kind).str}
+                        for name, (shape, kind) in shapes.items()}}
+    # the index is written last, a store without index is incomplete
+    with open(os.path.join(path, INDEX), "w") as file:
+        json.dump(index, file, indent=1)
+    del arrays, inputs
+    return open_store(path)
+
+
+class ResultStore:
+    """Read-only view of a store, arrays are numpy memmaps sliced without copies
+    npv, payback: scenario x technology
+    cumcflows: scenario x technology x year
+    inputs: dictionary of scenario input columns"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, INDEX)) as file:
+            self.index = json.load(file)
+        self.path = path
+        self.technologies = self.index["technologies"]
+        self.size = self.index["size"]
+        self.arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")[:self.size]
+                       for name in ARRAYS}
+        self.inputs = {name: np.load(os.path.join(path, "inputs", f"{name}.npy"), mmap_mode="r")[:self.size]
+                       for name in self.index["inputs"]}
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def npv(self):
+        return self.arrays["npv"]
+
+    @property
+    def payback(self):
+        return self.arrays["payback"]
+
+    @property
+    def cumcflows(self):
+        return self.arrays["cumcflows"]
+
+    def technology(self, name: str):
+        """Column of a technology in the scenario x technology arrays"""
+        return self.technologies.index(name)
+
+    def scenarios(self, index):
+        """Inputs of a slice or array of scenarios as a DataFrame, the only copying read"""
+        rows = np.arange(self.size)[index]
+        return pd.DataFrame({name: values[index] for name, values in self.inputs.items()}, index=rows)
+
+    def cashflows(self, scenario: int):
+        """Technology x year cumulative cash flows of one scenario, as Assets.calc_npv"""
+        return pd.DataFrame(self.cumcflows[scenario], index=self.technologies,
+                            columns=list(range(self.cumcflows.shape[2])))
+
+
+def open_store(path: str):
+    """Opens a store without reading its arrays"""
+    if not os.path.exists(os.path.join(path, INDEX)):
+        raise FileNotFoundError(f"No result store at {path}")
+    return ResultStore(path)
@@ -0,0 +1,249 @@
+import hashlib
+import numpy as np
+import os
+import pandas as pd
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import training as train
+from sweep import _evaluate_chunk, decode_points, grid_size
+
+# Out-of-core sweeps: grid points are decoded lazily in fixed-size chunks, evaluated
+# with calc_batch and folded into reducers, so memory does not grow with the grid.
+#   grid = make_grid(capacity=np.linspace(1e5, 1e7, 1000), CO2split=..., **{"prices.H2": ...})
+#   results = stream_sweep(grid, [TopK(10), Histogram(np.linspace(-5e4, 5e4, 101))],
+#                          checkpoint="sweep.npz")
+# An interrupted run called again with the same grid, chunk size and checkpoint resumes
+# after the last checkpointed chunk.
+
+
+class Reducer:
+    """Streaming reduction of a metric (npv or payback) per technology
+    update receives chunk columns from sweep.evaluate_points and the flat "index" of the points,
+    state and load convert the running state to and from a dictionary of arrays,
+    config returns the constructor parameters, a checkpoint only resumes the same reducers"""
+
+    def __init__(self, metric: str = "npv"):
+        self.metric = metric
+
+    def config(self):
+        return {"class": type(self).__name__, "metric": self.metric}
+
+    def values(self, chunk: dict):
+        """point x technology values of the metric"""
+        return np.stack([chunk[f"{self.metric}_{tech}"] for tech in train.TECHNOLOGIES], axis=1)
+
+    def state(self):
+        return {name: np.asarray(value) for name, value in vars(self).items() if name != "metric"}
+
+    def load(self, state: dict):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class Count(Reducer):
+    """Number of points and of points with a positive metric"""
+
+    def __init__(self, metric: str = "npv"):
+        super().__init__(metric)
+        self.total = np.zeros((), dtype=np.int64)
+        self.positive = np.zeros(len(train.TECHNOLOGIES), dtype=np.int64)
+
+    def update(self, chunk: dict):
+        values = self.values(chunk)
+        self.total = self.total + len(values)
+        self.positive = self.positive + (values > 0).sum(axis=0)
+
+    def result(self, grid: dict):
+        return pd.DataFrame({"positive": self.positive,
+                             "share": self.positive / max(int(self.total), 1)},
+                            index=train.TECHNOLOGIES)
+
+
+class MinMax(Reducer):
+    """Minimum and maximum of the metric and the points where they are reached"""
+
+    def __init__(self, metric: str = "npv"):
+        super().__init__(metric)
+        technologies = len(train.TECHNOLOGIES)
+        self.min = np.full(technologies, np.inf)
+        self.max = np.full(technologies, -np.inf)
+        self.argmin = np.zeros(technologies, dtype=np.int64)
+        self.argmax = np.zeros(technologies, dtype=np.int64)
+
+    def update(self, chunk: dict):
+        values = self.values(chunk)
+        columns = np.arange(values.shape[1])
+        # undefined values (0 / 0 paybacks) are skipped, an all-NaN column changes nothing
+        missing = np.isnan(values)
+        smallest = np.where(missing, np.inf, values)
+        largest = np.where(missing, -np.inf, values)
+        low, high = np.argmin(smallest, axis=0), np.argmax(largest, axis=0)
+        lower = smallest[low, columns] < self.min
+        higher = largest[high, columns] > self.max
+        self.min = np.where(lower, smallest[low, columns], self.min)
+        self.argmin = np.where(lower, chunk["index"][low], self.argmin)
+        self.max = np.where(higher, largest[high, columns], self.max)
+        self.argmax = np.where(higher, chunk["index"][high], self.argmax)
+
+    def result(self, grid: dict):
+        return pd.DataFrame({"min": self.min, "argmin": self.argmin, "max": self.max, "argmax": self.argmax},
+                            index=train.TECHNOLOGIES)
+
+
+class Histogram(Reducer):
+    """Running histogram of the metric on fixed bin edges
+    the first and last bins collect the values below and above the edges, infinite included"""
+
+    def __init__(self, edges, metric: str = "npv"):
+        super().__init__(metric)
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros((len(train.TECHNOLOGIES), len(self.edges) + 1), dtype=np.int64)
+
+    def config(self):
+        return dict(super().config(), edges=self.edges.tolist())
+
+    def update(self, chunk: dict):
+        values = self.values(chunk)
+        bins = np.searchsorted(self.edges, values, side="right")
+        for t in range(values.shape[1]):
+            self.counts[t] += np.bincount(bins[:, t], minlength=self.counts.shape[1])
+
+    def result(self, grid: dict):
+        labels = ([f"<{self.edges[0]:g}"]
+                  + [f"{low:g}-{high:g}" for low, high in zip(self.edges[:-1], self.edges[1:])]
+                  + [f">={self.edges[-1]:g}"])
+        return pd.DataFrame(self.counts.transpose(), index=labels, columns=train.TECHNOLOGIES)
+
+
+class TopK(Reducer):
+    """k points with the largest metric per technology, or the smallest with largest=False"""
+
+    def __init__(self, k: int = 10, metric: str = "npv", largest: bool = True):
+        super().__init__(metric)
+        self.k = np.array(k)
+        self.largest = np.array(largest)
+        technologies = len(train.TECHNOLOGIES)
+        self.best = np.empty((technologies, 0))
+        self.index = np.empty((technologies, 0), dtype=np.int64)
+
+    def config(self):
+        return dict(super().config(), k=int(self.k), largest=bool(self.largest))
+
+    def update(self, chunk: dict):
+        values = self.values(chunk).transpose()
+        sign = 1 if self.largest else -1
+        best = np.concatenate([self.best, values], axis=1)
+        index = np.concatenate([self.index, np.broadcast_to(chunk["index"], values.shape)], axis=1)
+        k = min(int(self.k), best.shape[1])
+        keep = np.argpartition(-sign * best, k - 1, axis=1)[:, :k]
+        self.best = np.take_along_axis(best, keep, axis=1)
+        self.index = np.take_along_axis(index, keep, axis=1)
+
+    def result(self, grid: dict):
+        """Technology -> DataFrame of the best points with their parameters, best first"""
+        tables = {}
+        for t, tech in enumerate(train.TECHNOLOGIES):
+            order = np.argsort(-self.best[t] if self.largest else self.best[t], kind="stable")
+            table = pd.DataFrame(decode_points(grid, self.index[t][order]))
+            table.insert(0, "index", self.index[t][order])
+            table[self.metric] = self.best[t][order]
+            tables[tech] = table
+        return tables
+
+
+def grid_signature(grid: dict, chunksize: int, reducers: list = (), prices=None, costs=None):
+    """Stable hash of the grid, chunk size, reducer parameters and price and cost tables,
+    a checkpoint only resumes the same sweep"""
+    configs = [reducer.config() for reducer in reducers]
+    tables = [table for table in (prices, costs) if table is not None]
+    shapes = [None if table is None else np.shape(table) for table in (prices, costs)]
+    digest = hashlib.sha1(repr((list(grid), chunksize, configs, shapes)).encode())
+    for values in list(grid.values()) + tables:
+        digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def save_checkpoint(path: str, signature: str, position: int, reducers: list):
+    """Writes the reducer states atomically, so an interruption never leaves a partial file"""
+    arrays = {"signature": np.array(signature), "position": np.array(position)}
+    for i, reducer in enumerate(reducers):
+        arrays.update({f"{i}.{name}": value for name, value in reducer.state().items()})
+    temporary = path + ".tmp.npz"
+    np.savez(temporary, **arrays)
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path: str, signature: str, reducers: list):
+    """Restores the reducer states, returns the position to resume from (0 without checkpoint)"""
+    if path is None or not os.path.exists(path):
+        return 0
+    with np.load(path) as data:
+        if str(data["signature"]) != signature:
+            raise ValueError(f"Checkpoint {path} belongs to another sweep")
+        for i, reducer in enumerate(reducers):
+            prefix = f"{i}."
+            reducer.load({name[len(prefix):]: data[name] for name in data.files if name.startswith(prefix)})
+        return int(data["position"])
+
+
+def iter_chunks(grid: dict, chunksize: int, start: int = 0):
+    """Lazily yields (start, stop) of the chunks of a grid from a position"""
+    total = grid_size(grid)
+    for position in range(start, total, chunksize):
+        yield position, min(position + chunksize, total)
+
+
+def stream_sweep(grid: dict,
+                 reducers: list,
+                 chunksize: int = 50000,
+                 processes: int = 1,
+                 prices=None,
+                 costs=None,
+                 checkpoint: str = None,
+                 checkpoint_every: float = 60):
+    """Evaluates a grid chunk by chunk and folds the results into reducers
+    receives:
+    grid: dictionary from sweep.make_grid, of any size
+    reducers: Count, MinMax, Histogram, TopK or other Reducer instances
+    chunksize: points evaluated per vectorized batch
+    processes: worker processes, 1 runs in-process; at most two chunks per worker are in flight
+    prices, costs: keuro / kWh tables passed to Assets.calc_batch
+    checkpoint: optional .npz file with the reducer states, written every checkpoint_every
+        seconds and at the end, and read to resume an interrupted run
+    returns the reducer results in the order of reducers
+    When using several processes, call from under `if __name__ == "__main__":`"""
+    signature = grid_signature(grid, chunksize, reducers, prices, costs)
+    position = load_checkpoint(checkpoint, signature, reducers)
+    last = time.monotonic()
+
+    def reduce(start, stop, chunk):
+        nonlocal position, last
+        chunk["index"] = np.arange(start, stop)
+        for reducer in reducers:
+            reducer.update(chunk)
+        position = stop
+        if checkpoint is not None and time.monotonic() - last >= checkpoint_every:
+            save_checkpoint(checkpoint, signature, position, reducers)
+            last = time.monotonic()
+
+    chunks = iter_chunks(grid, chunksize, position)
+    if processes == 1:
+        for start, stop in chunks:
+            reduce(start, stop, _evaluate_chunk((grid, start, stop, prices, costs)))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            # chunks are reduced in order, so the checkpoint position is always contiguous
+            pending = deque()
+            for start, stop in chunks:
+                pending.append((start, stop, pool.submit(_evaluate_chunk, (grid, start, stop, prices, costs))))
+                if len(pending) >= 2 * processes:
+                    start, stop, future = pending.popleft()
+                    reduce(start, stop, future.result())
+            while pending:
+                start, stop, future = pending.popleft()
+                reduce(start, stop, future.result())
+
+    if checkpoint is not None:
+        save_checkpoint(checkpoint, signature, position, reducers)
+    return [reducer.result(grid) for reducer in reducers]
@@ -0,0 +1,175 @@
+import numpy as np
+import os
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import training as train
+
+
+PARAMETERS = ["capacity"] + train.Scenario.parameters
+
+# reference values from Tutorial 1, used for any parameter not swept
+DEFAULTS = {"capacity": 2700000,
+            "capsubsidy": 0.5,
+            "drate": 0.05,
+            "taxrate": 0.36,
+            "CO2split": 0.4,
+            "biometyield": 0.48,
+            "heatgen": 0.60,
+            "elecgen": 0.28}
+
+
+def scenario_parameters(columns):
+    """Values of the Scenario.parameters for a table of inputs, in order
+    DEFAULTS fill the missing columns and the missing values of a column"""
+    return [columns[name].fillna(DEFAULTS[name]).values if name in columns else DEFAULTS[name]
+            for name in train.Scenario.parameters]
+
+
+def chunk_seeds(samples: int, chunksize: int, seed: int = 0):
+    """Yields (start, size, SeedSequence) for each chunk of samples draws
+    Every chunk has its own stream spawned from seed, so the draws do not depend on
+    which process evaluates a chunk"""
+    starts = range(0, samples, chunksize)
+    for start, child in zip(starts, np.random.SeedSequence(seed).spawn(len(starts))):
+        yield start, min(chunksize, samples - start), child
+
+
+def is_factor(name: str):
+    """True for price and cost factors, "prices.<commodity>" or "costs.<commodity>" """
+    prefix, _, commodity = name.partition(".")
+    return prefix in ("prices", "costs") and commodity in train.COMMODITIES
+
+
+def key_hint(name: str):
+    """Pointer to the other family of price and cost keys, empty for any other key
+    "prices.<commodity>" and "costs.<commodity>" are factors on the reference tables, while
+    "price.[<technology>.]<commodity>" and "cost..." are local values in euro / kWh (portfolio, service)"""
+    kind, _, rest = name.partition(".")
+    commodity = rest.split(".")[-1]
+    if is_factor(name):
+        return f" ({name} is a factor on the reference {kind[:-1]}, {kind[:-1]}.{commodity} is a value in euro / kWh)"
+    if kind in ("price", "cost") and commodity in train.COMMODITIES:
+        return f" ({name} is a value in euro / kWh, {kind}s.{commodity} is a factor on the reference {kind})"
+    return ""
+
+
+def make_grid(**values):
+    """Builds a sweep grid from scalars, lists or arrays for any of PARAMETERS
+    Parameters not given are fixed to DEFAULTS. Price levels are swept with factors
+    on a column of the price or cost table, "prices.<commodity>" or "costs.<commodity>",
+    given as keyword arguments, e.g. make_grid(**{"prices.biomethane": [0.8, 1, 1.2]})"""
+    unknown = [name for name in values if name not in PARAMETERS and not is_factor(name)]
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}" + "".join(key_hint(name) for name in sorted(unknown)))
+    grid = {}
+    for name in PARAMETERS + [name for name in values if is_factor(name)]:
+        grid[name] = np.atleast_1d(np.asarray(values.get(name, DEFAULTS.get(name)), dtype=float))
+    return grid
+
+
+def grid_size(grid: dict):
+    return int(np.prod([len(values) for values in grid.values()]))
+
+
+def decode_points(grid: dict, index: np.ndarray):
+    """Parameter columns for the points of the Cartesian product with the given flat indices"""
+    index = np.unravel_index(index, [len(values) for values in grid.values()])
+    return {name: grid[name][i] for name, i in zip(grid, index)}
+
+
+def grid_points(grid: dict, start: int, stop: int):
+    """Parameter columns for points start to stop of the Cartesian product
+    The product is never materialised, points are decoded from their flat index"""
+    return decode_points(grid, np.arange(start, stop))
+
+
+def scale_table(table: np.ndarray, samples: dict, prefix: str):
+    """Applies commodity factors to a technology x commodity table
+    returns a point x technology x commodity array, or the table when no factor is given"""
+    factors = [(train.COMMODITIES.index(name.split(".", 1)[1]), values)
+               for name, values in samples.items() if name.startswith(prefix + ".")]
+    if not factors:
+        return table
+    n = len(samples["capacity"])
+    scaled = np.repeat(table[None, :, :], n, axis=0)
+    for column, values in factors:
+        scaled[:, :, column] *= values[:, None]
+    return scaled
+
+
+def evaluate_batch(points: dict, prices=None, costs=None):
+    """BatchResult for a set of points
+    Price and cost factors of the points apply to prices and costs (the references by default)"""
+    assets = train.Assets(DEFAULTS["capacity"])
+    prices = assets.registry.prices if prices is None else prices
+    costs = assets.registry.costs if costs is None else costs
+    return assets.calc_batch(points["capacity"],
+                             *[points[name] for name in train.Scenario.parameters],
+                             prices=scale_table(prices, points, "prices"),
+                             costs=scale_table(costs, points, "costs"))
+
+
+def evaluate_points(points: dict, prices=None, costs=None):
+    """Vectorized NPV and payback per technology for a set of points"""
+    batch = evaluate_batch(points, prices, costs)
+    columns = dict(points)
+    for i, tech in enumerate(train.TECHNOLOGIES):
+        columns[f"npv_{tech}"] = batch.npv[:, i]
+        columns[f"payback_{tech}"] = batch.payback[:, i]
+    return columns
+
+
+def _evaluate_chunk(task):
+    grid, start, stop, prices, costs = task
+    return evaluate_points(grid_points(grid, start, stop), prices, costs)
+
+
+def run_sweep(grid: dict,
+              processes: int = None,
+              chunksize: int = 20000,
+              prices=None,
+              costs=None,
+              output: str = None):
+    """Evaluates the Cartesian product of a grid across a process pool
+    receives:
+    grid: dictionary from make_grid
+    processes: number of worker processes, defaults to all cores, 1 runs in-process
+    chunksize: points evaluated per vectorized batch in a worker
+    prices, costs: keuro / kWh tables passed to Assets.calc_batch
+    output: optional .npz, .npy, .parquet or .csv file for the results
+    returns a DataFrame with the swept parameters, NPV and payback per technology
+    When using several processes, call from under `if __name__ == "__main__":`"""
+    total = grid_size(grid)
+    processes = processes or os.cpu_count() or 1
+    tasks = [(grid, start, min(start + chunksize, total), prices, costs)
+             for start in range(0, total, chunksize)]
+
+    if processes == 1 or len(tasks) == 1:
+        chunks = [_evaluate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            chunks = list(pool.map(_evaluate_chunk, tasks))
+
+    results = pd.DataFrame({name: np.concatenate([chunk[name] for chunk in chunks])
+                            for name in chunks[0]})
+    if output is not None:
+        write_results(results, output)
+    return results
+
+
+def write_results(results: pd.DataFrame, output: str):
+    """Writes results column by column, the format follows the file extension
+    .npy files hold a structured array with one field per column"""
+    extension = os.path.splitext(output)[1].lower()
+    if extension == ".npz":
+        np.savez(output, **{name: results[name].values for name in results.columns})
+    elif extension == ".npy":
+        columns = [results[name].values if results[name].dtype != object else results[name].values.astype(str)
+                   for name in results.columns]
+        np.save(output, np.rec.fromarrays(columns, names=list(results.columns)))
+    elif extension == ".parquet":
+        results.to_parquet(output, index=False)
+    elif extension == ".csv":
+        results.to_csv(output, index=False)
+    else:
+        raise ValueError(f"Unsupported output format: {extension}")
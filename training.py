@@ -1,14 +1,680 @@
+import hashlib
 import numpy as np
 import os
 import pandas as pd
+import threading
+import time
+from collections import OrderedDict
+from enum import IntEnum
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+
+TECHNOLOGIES = ["AD", "ADCHP", "ADU", "ADH2"]
+COMMODITIES = ["biogas", "biomethane", "electricity", "heat", "CO2", "H2", "feedstock"]
+
+
+class Commodity(IntEnum):
+    """Column index of the technology x commodity tables"""
+    biogas = 0
+    biomethane = 1
+    electricity = 2
+    heat = 3
+    CO2 = 4
+    H2 = 5
+    feedstock = 6
+
+
+# Drivers the technology correlations are written in
+#   capacity: biogas capacity (cm/y), MW: capacity in MW, flow: biogas flow when operating (cm/h)
+#   CO2split: fraction by volume of CO2, biometyield: yield to biomethane from biogas
+#   heatgen, elecgen: thermal and electrical CHP efficiencies
+DRIVERS = ["capacity", "MW", "flow", "CO2split", "1-CO2split", "biometyield", "1-biometyield", "heatgen", "elecgen"]
+
+# reference product prices and fuel costs in euro / kWh (CO2 and H2 in euro / t)
+REFERENCE_PRICES = {"biomethane": 0.05,
+                    "electricity": 0.044}
+#https://www.statista.com/statistics/1047083/natural-gas-price-european-union-country/
+REFERENCE_COSTS = {"electricity": 0.044,
+                   "heat": 0.06,
+                   "feedstock": -20,
+                   "H2": 3000}
+
+
+class Technology(NamedTuple):
+    """Declarative description of a technology
+    name: row label in all technology tables
+    parent: technology whose capex and unit consumption are included, None for the base plant
+    capex: terms added to the parent capital costs (kEUR)
+    consumption: unit consumption terms added to the parent ones, by commodity (kWh/cm, t/cm)
+    production: unit production terms, by commodity (volume or efficiency based yields)
+    prices, costs: overrides of REFERENCE_PRICES and REFERENCE_COSTS for this technology
+    A term (coefficient, {driver: exponent}) is coefficient * product of driver**exponent"""
+    name: str
+    parent: Optional[str] = None
+    capex: tuple = ()
+    consumption: Mapping = MappingProxyType({})
+    production: Mapping = MappingProxyType({})
+    prices: Mapping = MappingProxyType({})
+    costs: Mapping = MappingProxyType({})
+
+
+class TermBlock:
+    """Sums of power-law terms compiled for vectorized evaluation
+    terms: list of (target, coefficient, power indices), targets index the flattened output"""
+
+    def __init__(self, terms: list, size: int):
+        terms = sorted(terms, key=lambda term: term[0])
+        width = max([len(term[2]) for term in terms] + [1])
+        self.size = size
+        self.coefficients = np.array([term[1] for term in terms], dtype=float)
+        # power 0 is the constant 1, used to pad terms with fewer factors
+        self.factors = np.zeros((len(terms), width), dtype=int)
+        for i, term in enumerate(terms):
+            self.factors[i, :len(term[2])] = term[2]
+        targets = np.array([term[0] for term in terms], dtype=int)
+        self.targets, self.starts = np.unique(targets, return_index=True)
+
+    def evaluate(self, powers: np.ndarray):
+        """powers: plant x power array from Registry.powers, returns plant x size"""
+        result = np.zeros((len(powers), self.size))
+        if len(self.coefficients):
+            values = self.coefficients * powers[:, self.factors].prod(axis=2)
+            result[:, self.targets] = np.add.reduceat(values, self.starts, axis=1)
+        return result
+
+
+class Registry:
+    """Ordered set of technologies evaluated together as one array operation"""
+
+    def __init__(self, technologies=()):
+        self.technologies = {}
+        self.compiled = None
+        for technology in technologies:
+            self.register(technology)
+
+    def register(self, technology: Technology):
+        if technology.name in self.technologies:
+            raise ValueError(f"Technology {technology.name} is already registered")
+        if technology.parent is not None and technology.parent not in self.technologies:
+            raise ValueError(f"Parent {technology.parent} of {technology.name} is not registered")
+        for field in (technology.consumption, technology.production, technology.prices, technology.costs):
+            unknown = set(field) - set(COMMODITIES)
+            if unknown:
+                raise ValueError(f"Unknown commodities for {technology.name}: {sorted(unknown)}")
+        terms = list(technology.capex)
+        terms += [term for field in (technology.consumption, technology.production) for terms in field.values()
+                  for term in terms]
+        for coefficient, factors in terms:
+            unknown = set(factors) - set(DRIVERS)
+            if unknown:
+                raise ValueError(f"Unknown drivers for {technology.name}: {sorted(unknown)}")
+        self.technologies[technology.name] = technology
+        self.compiled = None
+
+    @property
+    def names(self):
+        return list(self.technologies)
+
+    def __len__(self):
+        return len(self.technologies)
+
+    def lineage(self, name: str):
+        """A technology and its parents, base plant last"""
+        lineage = []
+        while name is not None:
+            lineage.append(self.technologies[name])
+            name = self.technologies[name].parent
+        return lineage
+
+    def compile(self):
+        """Compiles all technologies into term blocks and price tables, cached until the next register"""
+        if self.compiled is not None:
+            return self.compiled
+        powers = [None] # power 0 is the constant 1
+
+        def power_indices(factors):
+            indices = []
+            for driver, exponent in sorted(factors.items()):
+                if (driver, exponent) not in powers:
+                    powers.append((driver, exponent))
+                indices.append(powers.index((driver, exponent)))
+            return indices
+
+        capex, consumption, production = [], [], []
+        prices = np.zeros((len(self), len(COMMODITIES)))
+        costs = np.zeros((len(self), len(COMMODITIES)))
+        for t, name in enumerate(self.names):
+            lineage = self.lineage(name)
+            for technology in lineage:
+                for coefficient, factors in technology.capex:
+                    capex.append((t, coefficient, power_indices(factors)))
+                for commodity, terms in technology.consumption.items():
+                    c = COMMODITIES.index(commodity)
+                    for coefficient, factors in terms:
+                        consumption.append((t * len(COMMODITIES) + c, coefficient, power_indices(factors)))
+            for commodity, terms in lineage[0].production.items():
+                c = COMMODITIES.index(commodity)
+                for coefficient, factors in terms:
+                    production.append((t * len(COMMODITIES) + c, coefficient, power_indices(factors)))
+            for table, reference, field in ((prices, REFERENCE_PRICES, "prices"), (costs, REFERENCE_COSTS, "costs")):
+                values = dict(reference, **getattr(lineage[0], field))
+                for commodity, value in values.items():
+                    table[t, COMMODITIES.index(commodity)] = value
+
+        size = len(self) * len(COMMODITIES)
+        self.compiled = {"powers": powers,
+                         "capex": TermBlock(capex, len(self)),
+                         "consumption": TermBlock(consumption, size),
+                         "production": TermBlock(production, size),
+                         "prices": self.freeze(prices / 1000),
+                         "costs": self.freeze(costs / 1000),
+                         "digest": hashlib.sha1(repr(list(self.technologies.values())).encode()).hexdigest()}
+        return self.compiled
+
+    @staticmethod
+    def freeze(table: np.ndarray):
+        table.flags.writeable = False
+        return table
+
+    @property
+    def prices(self):
+        """Product prices, technology x commodity in keuro / kWh"""
+        return self.compile()["prices"]
+
+    @property
+    def costs(self):
+        """Fuel costs, technology x commodity in keuro / kWh"""
+        return self.compile()["costs"]
+
+    @property
+    def digest(self):
+        return self.compile()["digest"]
+
+    def powers(self, drivers: dict, n: int):
+        """Evaluates every driver power used by the technologies, plant x power"""
+        powers = self.compile()["powers"]
+        result = np.ones((n, len(powers)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for i, (driver, exponent) in enumerate(powers[1:], start=1):
+                result[:, i] = np.broadcast_to(drivers[driver], (n,))**exponent
+        return result
+
+    def evaluate(self, block: str, powers: np.ndarray):
+        """Capex (plant x technology) or unit flows (plant x technology x commodity)"""
+        values = self.compile()[block].evaluate(powers)
+        if block == "capex":
+            return values
+        return values.reshape(len(powers), len(self), len(COMMODITIES))
+
+
+CO2_DENSITY = 1.98 / 1000 # t/cm Wikipedia
+BIOMETHANE_DENSITY = 0.75 / 1000 # t/cm
+
+# Alternative options include anaerobic digestion alone, anerobic digestion with CHP,
+# anaerobic digestion with upgrade to biomethane, AD with upgrade and methanation with H2
+REGISTRY = Registry([
+    # electricity consumption as a function of the biogas flow in cm/h, in kWh / cm
+    # heat estimated in kWh / cm (Giarola et al), assuming half of the electricity consumption
+    # feedstock kWh consumption as a function of unitprod of biogas in cm
+    Technology("AD",
+               capex=[(11202, {"MW": 0.3486})],
+               consumption={"electricity": [(8.18, {"flow": -0.304})],
+                            "heat": [(0.5 * 8.18, {"flow": -0.304})],
+                            "feedstock": [(0.05, {})]},
+               production={"heat": [(0.85, {})]}),
+    # CHP conversion, Xiao Li's thesis
+    Technology("ADCHP",
+               parent="AD",
+               capex=[(1686.7, {"MW": 0.7269})],
+               consumption={"electricity": [(0.13, {})]},
+               production={"heat": [(1, {"heatgen": 1})],
+                           "electricity": [(1, {"elecgen": 1})]},
+               prices={"electricity": 0.54}),
+    # biomethane upgrade
+    # Techno-Economic Assessment of Biological Biogas Upgrading Based on Danish Biogas Plants (paper)
+    # biomethane is obtained considering a volume-based yield cm of CH4 / cm, CO2 in t
+    Technology("ADU",
+               parent="AD",
+               capex=[(511.423, {"MW": 0.6569})],
+               consumption={"electricity": [(0.0145, {"flow": 0.5627})],
+                            "heat": [(0.5 * 0.0145, {"flow": 0.5627})]},
+               production={"biomethane": [(1, {"biometyield": 1, "1-CO2split": 1})],
+                           "CO2": [(CO2_DENSITY, {"1-biometyield": 1})]}),
+    # ADH2 works as ADU but with H2 for methanation of the CO2
+    # https://www.sciencedirect.com/science/article/pii/S0016236123013923
+    # 1.91 cm CH4 / t CO2 methane yield, H2 in t
+    Technology("ADH2",
+               parent="AD",
+               capex=[(0.06, {"capacity": 0.7, "CO2split": 0.7})],
+               consumption={"electricity": [(0.0145, {"flow": 0.5627})],
+                            "heat": [(0.5 * 8.18, {"flow": -0.304}),
+                                     (0.0145, {"flow": 0.5627}),
+                                     (2.42 * CO2_DENSITY / 1.91, {"CO2split": 1})],
+                            "CO2": [(CO2_DENSITY, {"CO2split": 1})],
+                            "H2": [(0.15 * CO2_DENSITY, {"CO2split": 1})]},
+               production={"biomethane": [(1, {"biometyield": 1, "1-CO2split": 1}),
+                                          (0.353 * CO2_DENSITY / BIOMETHANE_DENSITY, {"CO2split": 1})],
+                           "CO2": [(CO2_DENSITY, {"1-biometyield": 1})]}),
+])
+
+# reference prices and fuel costs of the built-in technologies in keuro / kWh
+PRICES = REGISTRY.prices
+FCOSTS = REGISTRY.costs
+
+
+def commodity_frame(table: np.ndarray, technologies: list = TECHNOLOGIES):
+    """Technology x commodity DataFrame from a table, only built at the API boundary"""
+    return pd.DataFrame(np.array(table, dtype=float), index=technologies, columns=COMMODITIES)
+
+
+class BatchResult(NamedTuple):
+    """Stacked results for a batch of plants
+    capex, cf_wam, cf_woam, npv, payback: plant x technology
+    production, consumption, revenues, fuel_costs: plant x technology x commodity
+    cflows, cumcflows: plant x technology x year (year 0 is the investment)
+    payback_year, discounted_payback_year: plant x technology years until the
+        undiscounted / discounted cumulative cash flow turns positive, inf if never"""
+    capex: np.ndarray
+    production: np.ndarray
+    consumption: np.ndarray
+    revenues: np.ndarray
+    fuel_costs: np.ndarray
+    cf_wam: np.ndarray
+    cf_woam: np.ndarray
+    cflows: np.ndarray
+    cumcflows: np.ndarray
+    npv: np.ndarray
+    payback: np.ndarray
+    payback_year: np.ndarray
+    discounted_payback_year: np.ndarray
+
+
+class Physical(NamedTuple):
+    """Price-independent layer of a batch of plants
+    capex: capital costs before subsidies (kEUR), plant x technology
+    production, consumption: annual flows, plant x technology x commodity"""
+    capex: np.ndarray
+    production: np.ndarray
+    consumption: np.ndarray
+
+
+class TrajectoryResult(NamedTuple):
+    """Year-indexed results for a batch of plants, every array is plant x technology x year
+    with years 0 (investment) to lifetime
+    investment: capital costs net of subsidies spent in each year (kEUR)
+    revenues, fuel_costs: annual revenues and fuel costs
+    annual: cash flows after taxes and investments, cflows: discounted, cumcflows: cumulative
+    npv, payback, payback_year, discounted_payback_year: plant x technology, as in BatchResult"""
+    investment: np.ndarray
+    revenues: np.ndarray
+    fuel_costs: np.ndarray
+    annual: np.ndarray
+    cflows: np.ndarray
+    cumcflows: np.ndarray
+    npv: np.ndarray
+    payback: np.ndarray
+    payback_year: np.ndarray
+    discounted_payback_year: np.ndarray
+
+
+class IRRResult(NamedTuple):
+    """Internal rates of return, arrays shaped as the flows without their year axis
+    rate: rate at which the NPV of the flows is zero, the lowest one when there are several,
+        nan if the NPV does not change sign between the solver bounds
+    roots: number of sign changes of the NPV on the solver grid, 0 without IRR,
+        more than 1 when the flows have multiple IRRs"""
+    rate: np.ndarray
+    roots: np.ndarray
+
+
+class CashFlows(NamedTuple):
+    """Single-pass cash flow results for one plant, indexed by technology
+    capex: capital costs net of subsidies (kEUR)
+    annual: yearly cash flows with (wam) and without (woam) amortization
+    discounted, cumulative: technology x year discounted and cumulative cash flows
+    npv: cumulative discounted cash flow at the NPV horizon (year 20 by default)
+    payback: capital costs over the average discounted cash flow between the end of
+        amortization and the NPV horizon (years 6 to 19 by default)
+    payback_years: simple and discounted payback years, inf if never reached"""
+    capex: pd.Series
+    annual: pd.DataFrame
+    discounted: pd.DataFrame
+    cumulative: pd.DataFrame
+    npv: pd.Series
+    payback: pd.Series
+    payback_years: pd.DataFrame
+
+    def copy(self):
+        """Deep copy, the frames can be modified without affecting other results"""
+        return CashFlows(*[value.copy() for value in self])
+
+
+def annuity_factor(drate, start: int, stop: int):
+    """Sum of the discount factors from year start to year stop (closed form)
+    drate can be a scalar or an array of discount rates"""
+    drate = np.asarray(drate, dtype=float)
+    if stop < start:
+        return np.zeros_like(drate)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = ((1 + drate)**(1 - start) - (1 + drate)**(-stop)) / drate
+    return np.where(drate == 0, stop - start + 1.0, factor)
+
+
+def crossing_year(cumcflows: np.ndarray):
+    """Fractional year at which cumulative cash flows first turn non-negative
+    receives any ... x year array with year 0 as the investment year,
+    interpolates linearly within the crossing year and returns inf if never reached"""
+    crossed = cumcflows >= 0
+    k = np.argmax(crossed, axis=-1)
+    never = ~crossed.any(axis=-1)
+    before = np.take_along_axis(cumcflows, np.maximum(k - 1, 0)[..., None], axis=-1)[..., 0]
+    after = np.take_along_axis(cumcflows, k[..., None], axis=-1)[..., 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        year = np.where(k > 0, k - 1 - before / (after - before), 0.0)
+    return np.where(never, np.inf, year)
+
+
+IRR_GRID = np.unique(np.concatenate([np.linspace(-0.95, 1, 79), np.geomspace(1, 10, 21)]))
+
+
+def irr(flows: np.ndarray, grid: np.ndarray = IRR_GRID, tol: float = 1e-10, maxiter: int = 50):
+    """Internal rates of return of any ... x year array of undiscounted flows, year 0 first
+    The NPV is evaluated on a grid of rates (-95% to 1000%) to count its roots and bracket
+    the lowest one, which is then refined with Newton steps kept inside the bracket by
+    bisection. Roots closer than the grid spacing may be missed. Returns an IRRResult"""
+    flows = np.asarray(flows, dtype=float)
+    shape = flows.shape[:-1]
+    flows = flows.reshape(-1, flows.shape[-1])
+    years = np.arange(flows.shape[1])
+    npv = flows @ (1 + grid)[None, :] ** -years[:, None]
+    changes = np.signbit(npv[:, 1:]) != np.signbit(npv[:, :-1])
+    roots = changes.sum(axis=1)
+    found = roots > 0
+    first = np.argmax(changes, axis=1)
+    low, high = grid[first], grid[first + 1]
+    positive = npv[np.arange(len(npv)), first] > 0
+    rate = np.where(found, (low + high) / 2, np.nan)
+    # only the rows that have not converged yet are iterated
+    active = np.flatnonzero(found)
+    for _ in range(maxiter):
+        if not len(active):
+            break
+        current, rows = rate[active], flows[active]
+        discount = (1 + current[:, None]) ** -years
+        value = (rows * discount).sum(axis=1)
+        slope = -(rows * years * discount).sum(axis=1) / (1 + current)
+        # keep the bracket where the NPV changes sign
+        above = (value > 0) == positive[active]
+        low[active] = np.where(above, current, low[active])
+        high[active] = np.where(above, high[active], current)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = current - value / slope
+        inside = (step >= low[active]) & (step <= high[active])
+        update = np.where(inside, step, (low[active] + high[active]) / 2)
+        rate[active] = update
+        converged = (value == 0) | (np.abs(update - current) <= tol * (1 + np.abs(current)))
+        active = active[~converged]
+    return IRRResult(rate.reshape(shape), roots.reshape(shape))
+
+
+class Scenario:
+    """Scenario inputs shared by the calc_* methods
+    The digest is a stable hash of the parameter values and of the price/cost tables,
+    so two scenarios with the same content compare equal"""
+
+    parameters = ["capsubsidy", "drate", "taxrate", "CO2split", "biometyield", "heatgen", "elecgen"]
+    # parameters of capital costs, production and consumption, the others only act on prices
+    physical = ["CO2split", "biometyield", "heatgen", "elecgen"]
+
+    def __init__(self,
+                 capsubsidy: float,
+                 drate: float,
+                 taxrate: float,
+                 CO2split: float,
+                 biometyield: float,
+                 heatgen: float,
+                 elecgen: float,
+                 newprices: pd.DataFrame = None,
+                 newcosts: pd.DataFrame = None):
+        self.capsubsidy = float(capsubsidy)
+        self.drate = float(drate)
+        self.taxrate = float(taxrate)
+        self.CO2split = float(CO2split)
+        self.biometyield = float(biometyield)
+        self.heatgen = float(heatgen)
+        self.elecgen = float(elecgen)
+        self.newprices = 0 * pd.DataFrame() if newprices is None else newprices
+        self.newcosts = 0 * pd.DataFrame() if newcosts is None else newcosts
+        self.digest = self.calc_digest()
+
+    def values(self):
+        """Parameter values in the order taken by the calc_* methods"""
+        return tuple(getattr(self, name) for name in self.parameters)
+
+    def physical_values(self):
+        """Values of the physical parameters"""
+        return tuple(getattr(self, name) for name in self.physical)
+
+    def args(self):
+        """Positional arguments for calc_npv, calc_payback and calc_cashflows"""
+        return self.values() + (self.newprices, self.newcosts)
+
+    def calc_digest(self):
+        digest = hashlib.sha1(np.array(self.values(), dtype=float).tobytes())
+        for table in (self.newprices, self.newcosts):
+            digest.update(repr((list(table.index), list(table.columns))).encode())
+            digest.update(np.ascontiguousarray(table.values, dtype=float).tobytes())
+        return digest.hexdigest()
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        return isinstance(other, Scenario) and self.digest == other.digest
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={value}" for name, value in zip(self.parameters, self.values()))
+        return f"Scenario({values}, digest={self.digest[:8]})"
+
+
+class LRUCache:
+    """Bounded least-recently-used memo with hit, miss and eviction counters"""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """Returns (True, value) for a cached key and (False, None) otherwise"""
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return True, self.entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key, compute):
+        """Returns the cached value for key, calling compute() on a miss"""
+        found, value = self.lookup(key)
+        if not found:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def info(self):
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "maxsize": self.maxsize}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+# results of calc_scenario shared by all Assets in the process
+memo = LRUCache(maxsize=256)
+# price-independent layers of calc_scenario, reused when only prices, costs,
+# capsubsidy, drate or taxrate change
+physical_memo = LRUCache(maxsize=256)
+
+
+class Profiler:
+    """Opt-in timing of the Assets.calc_* methods
+    Methods are wrapped only while enabled, so profiling costs nothing when off.
+    Records wall time and call counts per method and per call path (call tree),
+    along with the scenario cache hits and misses since the last reset.
+    enable and disable are counted, the methods are restored when every user has disabled;
+    use `with profiler:` so that an exception or interrupted run always disables"""
+
+    def __init__(self):
+        self.originals = {}
+        self.users = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    @property
+    def enabled(self):
+        return bool(self.originals)
+
+    def reset(self):
+        """Clears the records, a no-op while enabled so that concurrent users keep theirs"""
+        with self.lock:
+            if self.users:
+                return
+            self.calls = {} # call path -> [calls, wall time]
+            self.memo_start = memo.info()
+            self.physical_start = physical_memo.info()
+
+    def enable(self):
+        with self.lock:
+            self.users += 1
+            if self.users > 1:
+                return
+            for name in dir(Assets):
+                method = getattr(Assets, name)
+                if name.startswith("calc_") and callable(method):
+                    self.originals[name] = method
+                    setattr(Assets, name, self.wrap(name, method))
+
+    def disable(self):
+        with self.lock:
+            self.users = max(self.users - 1, 0)
+            if self.users:
+                return
+            for name, method in self.originals.items():
+                setattr(Assets, name, method)
+            self.originals = {}
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def wrap(self, name, method):
+        profiler = self
+
+        def timed(*args, **kwargs):
+            stack = getattr(profiler.local, "stack", None)
+            if stack is None:
+                stack = profiler.local.stack = []
+            stack.append(name)
+            path = tuple(stack)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                stack.pop()
+                with profiler.lock:
+                    record = profiler.calls.setdefault(path, [0, 0.0])
+                    record[0] += 1
+                    record[1] += elapsed
+        timed.__name__ = method.__name__
+        timed.__doc__ = method.__doc__
+        return timed
+
+    def snapshot(self):
+        """Copy of the records, {call path: (calls, wall time)}, taken under the lock"""
+        with self.lock:
+            return {path: tuple(record) for path, record in self.calls.items()}
+
+    def summary(self, calls: dict = None):
+        """Calls, total and own wall time (s) by method, slowest first
+        calls: records as returned by snapshot, a new snapshot by default"""
+        calls = self.snapshot() if calls is None else calls
+        rows = {}
+        for path, (count, elapsed) in calls.items():
+            row = rows.setdefault(path[-1], [0, 0.0, 0.0])
+            row[0] += count
+            # recursive calls are only timed at the outermost level
+            if path[-1] not in path[:-1]:
+                row[1] += elapsed
+            row[2] += elapsed
+        for path, (count, elapsed) in calls.items():
+            if len(path) > 1:
+                rows[path[-2]][2] -= elapsed
+        summary = pd.DataFrame.from_dict(rows, orient="index", columns=["calls", "total", "own"])
+        return summary.sort_values("total", ascending=False)
+
+    def cache(self):
+        """Scenario and physical layer cache hits and misses since the last reset"""
+        info = memo.info()
+        physical = physical_memo.info()
+        return {"hits": info["hits"] - self.memo_start["hits"],
+                "misses": info["misses"] - self.memo_start["misses"],
+                "physical_hits": physical["hits"] - self.physical_start["hits"],
+                "physical_misses": physical["misses"] - self.physical_start["misses"]}
+
+    def report(self):
+        """Text report with the summary, the call tree and the cache counters"""
+        calls = self.snapshot()
+        lines = [f"{'method':<28}{'calls':>8}{'total ms':>12}{'own ms':>12}"]
+        for name, row in self.summary(calls).iterrows():
+            lines.append(f"{name:<28}{int(row['calls']):>8}{row['total'] * 1000:>12.3f}{row['own'] * 1000:>12.3f}")
+        lines.append("")
+        lines.append("call tree")
+        for path in sorted(calls):
+            count, elapsed = calls[path]
+            lines.append(f"{'  ' * len(path)}{path[-1]} x{count} {elapsed * 1000:.3f} ms")
+        cache = self.cache()
+        lines.append("")
+        lines.append(f"scenario cache: {cache['hits']} hits, {cache['misses']} misses")
+        lines.append(f"physical cache: {cache['physical_hits']} hits, {cache['physical_misses']} misses")
+        return "\n".join(lines)
+
+
+# instrumentation of Assets, see Profiler.enable
+profiler = Profiler()
 
 
 class Assets:
 
-    def __init__(self, capacity):
+    def __init__(self, capacity, registry: Registry = None):
         # Alternative options include anaerobic digestion alone, anerobic digestion 
         # with CHP, anaerobic digestion with upgrade to biomethane, AD with CHP with upgrade
-        technologies = ["AD", "ADCHP", "ADU", "ADH2"]
+        # (the built-in technologies of REGISTRY)
+        self.registry = REGISTRY if registry is None else registry
+        technologies = self.registry.names
         data = np.array([capacity for i in range(len(technologies))])
         self.assets = pd.DataFrame(data=data, index=technologies, columns=["capacity"])
 
@@ -21,6 +687,8 @@ class Assets:
         self.utilisation_factor = 0.9 # fraction of hours for the plant to operate over a year
         self.LHV = 22 # lower heating value MJ/cm
         self.LHVkWh = 22 * 1000/ 3600 # lower heating value kWh/cm
+        self.amortisation_years = 5 # years of straight-line amortization of capital costs
+        self.horizon = 20 # year at which the NPV is reported
 
     def calc_units(self):
         """These are the units for commodity flows"""
@@ -28,6 +696,22 @@ class Assets:
         units = ["kWh/y", "kWh/y", "kWh/y", "kWh/y", "cm/y" ]
         return dict(zip(quantities,units))
 
+    def _cap2prod(self):
+        """Conversion factors from capacity units to production flow units, by commodity"""
+        conv = np.zeros(len(Commodity))
+        conv[Commodity.biogas] = self.LHVkWh / self.hours
+        conv[Commodity.biomethane] = 36 * 1000/(3600 * self.hours)
+        conv[Commodity.electricity] = self.LHVkWh / self.hours
+        conv[Commodity.heat] = self.LHVkWh / self.hours
+        conv[Commodity.CO2] = 1 / self.hours
+        return conv
+
+    def _cap2cons(self):
+        """Conversion factors from capacity units to consumption flow units, by commodity"""
+        conv = np.ones(len(Commodity))
+        conv[Commodity.biogas] = 1 / self.hours
+        return conv
+
     def cap2prod(self):
         """
         Conversion of units from original capacity units to production flow units
@@ -37,21 +721,7 @@ class Assets:
         heat: from cm/y to kWh/y
         CO2: from cm/y to cm/y
         """
-        unit_converter = 0 * self.assets.copy()
-
-        commodities = ["biogas", "biomethane", "electricity", "heat", "CO2", "H2", "feedstock"]
-        
-        unit_converter["biogas"] = self.LHVkWh / self.hours
-        unit_converter["biomethane"] = 36 * 1000/(3600 * self.hours)
-        unit_converter["electricity"] = self.LHVkWh / self.hours
-        unit_converter["heat"] = self.LHVkWh  / self.hours
-        unit_converter["CO2"] = 1 / self.hours      
-        unit_converter["H2"] = 0  
-        unit_converter["feedstock"] = 0  
-
-        unit_converter = unit_converter.drop("capacity", axis=1)
-        unit_converter = unit_converter[commodities]    
-        return unit_converter
+        return self._frame(np.broadcast_to(self._cap2prod(), (len(self.registry), len(Commodity))))
 
     def cap2cons(self):
         """
@@ -63,118 +733,28 @@ class Assets:
         heat: no conv
         CO2: no conv
         """
-        unit_converter = 0 * self.assets.copy()
+        return self._frame(np.broadcast_to(self._cap2cons(), (len(self.registry), len(Commodity))))
 
-        commodities = ["biogas", "biomethane", "electricity", "heat", "CO2", "H2", "feedstock"]
-
-        unit_converter["biogas"] = 1 / self.hours
-        unit_converter["biomethane"] = 1
-        unit_converter["electricity"] = 1
-        unit_converter["heat"] = 1
-        unit_converter["CO2"] = 1   
-        unit_converter["H2"] = 1     
-        unit_converter["feedstock"] = 1
+    @property
+    def technologies(self):
+        return self.registry.names
 
-        unit_converter = unit_converter.drop("capacity", axis=1)
-        unit_converter = unit_converter[commodities]
-        return unit_converter
+    def _frame(self, table: np.ndarray):
+        return commodity_frame(table, self.technologies)
 
+    def _capacity(self):
+        """Plant capacity as a one-plant batch"""
+        return self.assets["capacity"].values[:1].astype(float)
 
     def calc_capcosts(self, CO2split: float):
         """Returns capital costs in kEUR (2024)"""
-        """Asset capacity is converted from cm/y into MW"""
-        # biogas capex
-        capacity = self.assets * self.LHV / self.hours / 3600
-  
-        capital_costs = 11202 * capacity**0.3486
-
-        # biogas capex and CHP conversion
-        ccAD = capital_costs.loc[capital_costs.index=="AD"].values
-        capAD = capacity.loc[capacity.index=="AD"].values
-        ccADCHP = ccAD + 1686.7 * capAD**0.7269
-        ccADU = ccAD + 511.423 * capAD**0.6569
-
-        capital_costs.loc[capital_costs.index=="AD"] = ccAD 
-        capital_costs.loc[capital_costs.index=="ADCHP"] = ccADCHP
-        # biogas capex and biomethane upgrade 
-        # Techno-Economic Assessment of Biological Biogas Upgrading Based on Danish Biogas Plants (paper)
-        capital_costs.loc[capital_costs.index=="ADU"] = ccADU
-
-        capital_costs.loc[capital_costs.index=="ADH2"] = ccAD
-        #assumption on scaling factor
-        capADH2 = self.assets.loc[self.assets.index=="AD"].values*CO2split
-
-        capital_costs.loc[capital_costs.index=="ADH2"] += 0.06 * (capADH2)**0.7 
-
-        capital_costs.columns = ["capital_costs"]
-        return capital_costs
-
+        capital_costs = self._batch_capcosts(self._capacity(), CO2split)[0]
+        return pd.DataFrame(capital_costs[:, None], index=self.technologies, columns=["capital_costs"])
 
     def calc_unitconsumption(self, CO2split: float):
         """Determine unit fuel consumption by technology"""
         """Values expressed in kWh/cm"""
-        unitcons = 0 * self.assets.copy()
-
-        commodities = ["biogas", "biomethane", "electricity", "heat", "CO2", "H2", "feedstock"]
-
-        [unitcons.insert(loc=0, column=col, value=0) for col in commodities]
-        unitcons = unitcons.drop("capacity", axis=1)
-        
-        capacity = self.assets.loc[self.assets.index=="AD"].values[0]
-        # electricity consumption as a function of unitprod of biogas in cm/h
-        # electricity in kWh / cm
-        unitcons.loc[unitcons.index=="AD", "electricity"] = 8.18 
-        unitcons.loc[unitcons.index=="AD", "electricity"]*= (self.utilisation_factor)**(-0.304) 
-        unitcons.loc[unitcons.index=="AD", "electricity"]*= (capacity)**(-0.304)
-        unitcons.loc[unitcons.index=="AD", "electricity"]*= (1/self.hours)**(-0.304)
-
-        # heat estimated in kWh / cm (Giarola et al)
-        # assuming heat consumption is half of electricity consumption
-        unitcons.loc[unitcons.index=="AD", "heat"] = 0.5 * unitcons.loc[unitcons.index=="AD", "electricity"].values[0] 
-        # this includes boiler efficiency and represents indeed ntural gas consumption
-        unitcons.loc[unitcons.index=="AD", "heat"] = unitcons.loc[unitcons.index=="AD", "heat"]
-
-        # electricity consumption as a function of production of biogas in cm
-        # electricity in kWh / cm
-        # Xiao Li's thesis
-        capacity = self.assets.loc[self.assets.index=="ADCHP"].values[0]
-        refvalue = unitcons.loc[unitcons.index=="AD", "electricity"].values[0]
-        unitcons.loc[unitcons.index=="ADCHP", "electricity"] = refvalue + 0.13
-        refvalue = unitcons.loc[unitcons.index=="AD", "heat"].values[0]
-        unitcons.loc[unitcons.index=="ADCHP", "heat"] = refvalue
-
-        # electricity consumption as a function of unitprod of biogas in cm/h
-        # electricity in kWh / cm of biogas
-        capacity = self.assets.loc[self.assets.index=="ADU"].values[0]
-        topup = 0.0145 * (self.utilisation_factor / self.hours)**0.5627
-        topup *= capacity**0.5627
-        refvalue = unitcons.loc[unitcons.index=="AD", "electricity"].values[0]
-        unitcons.loc[unitcons.index=="ADU", "electricity"] = refvalue + topup
-        unitcons.loc[unitcons.index=="ADU", "heat"] = (1 + topup/refvalue) * unitcons.loc[unitcons.index=="AD", "heat"].values[0]
-        #unitcons.loc[unitcons.index=="ADU", "biogas"] = 1
-
-        # electricity consumption as a function of unitprod of biogas in cm/h
-        # electricity in kWh / cm of biogas
-        CO2density = 1.98 / 10**3 #t/cm Wikipedia
-        methan_yield = 1.91 #0.353 CH4/CO2 initial https://www.sciencedirect.com/science/article/pii/S0016236123013923
-        capacity = self.assets.loc[self.assets.index=="ADH2"].values[0]
-        refvalue = unitcons.loc[unitcons.index=="ADU", "electricity"].values[0] 
-        refcapacity =  methan_yield / CO2density / CO2split
-        unitcons.loc[unitcons.index=="ADH2", "heat"] = refvalue + 2.42 / refcapacity
-        unitcons.loc[unitcons.index=="ADH2", "electricity"] = refvalue
-
-        # H2 in t defined from cm/h
-        refcapacity = CO2split * CO2density  
-        unitcons.loc[unitcons.index=="ADH2", "CO2"] = refcapacity
-        unitcons.loc[unitcons.index=="ADH2", "H2"] = 0.15 * refcapacity
-        #unitcons.loc[unitcons.index=="ADH2", "biogas"] = 1
-
-        # feedstock kWh consumption as a function of unitprod of biogas in cm       
-        unitcons["feedstock"] = 0.05
-
-        unitcons = unitcons[commodities]
-        return unitcons
-
+        return self._frame(self._batch_unitconsumption(self._capacity(), CO2split)[0])
 
     def calc_unitproduction(self, CO2split: float, biometyield:float, heatgen: float, elecgen: float):
         """Determine unit fuel consumption by technology
@@ -183,39 +763,8 @@ class Assets:
         biometyield: yield to biomethane from biogas
         heatgen: thermal CHP efficiency
         elecgen: electrical CHP efficiency"""
-
-        unitprod = 0 * pd.DataFrame().reindex_like(self.assets)
-        commodities = ["biogas", "biomethane", "electricity", "heat", "CO2", "H2", "feedstock"]
-
-        [unitprod.insert(loc=0, column=col, value=0) for col in commodities]
-        unitprod = unitprod.drop("capacity", axis=1)
-        unitprod = unitprod[commodities]
-        # electricity consumption as a function of production of biogas in cm/h
-        # electricity in kWhoutput / kWinput
-        unitprod.loc[unitprod.index=="AD", "biogas"] = 0 #1 
-        unitprod.loc[unitprod.index=="AD", "heat"] = 0.85
-        unitprod.loc[unitprod.index=="ADCHP", "heat"] = heatgen
-        unitprod.loc[unitprod.index=="ADCHP", "electricity"] = elecgen
-
-        # asset capacity is in cm/y
-        # biomethane is obtained considering a volume-based yield cm of CH4 / cm
-
-        unitprod.loc[unitprod.index=="ADU", "biomethane"] =  biometyield * (1- CO2split)
-        # CO2 in t
-        CO2density = 1.98 / 1000 # density in t/m3
-        unitprod.loc[unitprod.index=="ADU", "CO2"] =  (1 - biometyield ) * CO2density
-
-        # ADH2 works as ADU but with H2
-        # https://www.sciencedirect.com/science/article/pii/S0016236123013923
-        methan_conv = 0.98
-        biometh_density = 0.75 / 1000 # t / m3
-        refvalue = unitprod.loc[unitprod.index=="ADU", "biomethane"].values[0] # cm CH4 / cm
-        topup = 0.353 * CO2split * CO2density / biometh_density 
-        unitprod.loc[unitprod.index=="ADH2", "biomethane"] = refvalue + topup
-        unitprod.loc[unitprod.index=="ADH2", "CO2"] = (1 - biometyield ) * CO2density
-
-        unitprod = unitprod[commodities]
-        return unitprod
+        unitprod = self._batch_unitproduction(self._capacity(), CO2split, biometyield, heatgen, elecgen)
+        return self._frame(unitprod[0])
 
     def calc_production(self,CO2split: float, biometyield: float, heatgen: float, elecgen: float):
         """Determine production by technology
@@ -224,20 +773,8 @@ class Assets:
         biometyield: yield to biomethane from biogas
         heatgen: thermal CHP efficiency
         elecgen: electrical CHP efficiency"""
-
-        unit_converter = self.cap2prod()     
-        
-        outputs = self.calc_unitproduction(CO2split, biometyield, heatgen, elecgen)
-
-        production = pd.concat([outputs[col] * self.assets.capacity for col in outputs.columns], axis=1)
-
-        production.columns = outputs.columns #rename columns
-
-        production *= self.utilisation_factor
-
-        production = pd.concat([production[col] * unit_converter[col] for col in outputs.columns], axis=1)
-
-        return production * self.hours
+        production = self._batch_production(self._capacity(), CO2split, biometyield, heatgen, elecgen)
+        return self._frame(production[0])
 
     def calc_consumption(self, CO2split: float, biometyield: float, heatgen: float, elecgen: float):
         """Determine consumption by technology
@@ -246,73 +783,17 @@ class Assets:
         biometyield: yield to biomethane from biogas (kwh/y)
         heatgen: thermal CHP efficiency (kwh/y)
         elecgen: electrical CHP efficiency (kwh/y)"""   
-
-        unit_converter = self.cap2cons()   
-
-        fuels = self.calc_unitconsumption(CO2split)
-
-        consumption = pd.concat([fuels[col] * self.assets.capacity for col in fuels.columns], axis=1)
-
-        consumption.columns = fuels.columns #rename columns
-
-        consumption *= self.utilisation_factor
-
-        # Divide by self.hours
-        consumption = pd.concat([consumption[col] * unit_converter['biogas'].values[0] for col in fuels.columns], axis=1)
-        
-        consumption.columns = fuels.columns #rename columns  
-        
-        # Multiply by self.hours to get annual quanitites (analogy with production)
-        return consumption * self.hours
+        return self._frame(self._batch_consumption(self._capacity(), CO2split)[0])
 
     def calc_prices(self):
         """Estimate prices"""
-        prices = 0 * pd.DataFrame().reindex_like(self.assets)
-        commodities = ["biogas", "biomethane", "electricity", "heat", "CO2", "H2", "feedstock"]
-
-        [prices.insert(loc=0, column=col, value=0) for col in commodities]
-
-        prices.loc["AD", "biogas"] = 0.0  #euro / kWh
-        prices.loc["AD", "electricity"] = 0.044  #euro / kWh
-        prices["biomethane"] = 0.05  #euro / kWh
-        prices.loc["ADU", "electricity"] = 0.044  #euro / kWh
-        prices.loc["ADCHP", "electricity"] = 0.54 #euro / kWh
-        prices.loc["ADH2", "electricity"] = 0.044 #euro / kWh
-        #https://www.statista.com/statistics/1047083/natural-gas-price-european-union-country/
-        prices["heat"] = 0
-        prices["feedstock"] = 0 #euro/kWh
-        prices["H2"] = 0 #euro/t
-        prices.loc["ADH2", "CO2"] = 0 #euro/t
-        prices = prices.drop("capacity", axis=1)
-
-        prices = prices[commodities] / 1000# keuro / kWh
-        return prices 
+        return self._frame(self.registry.prices)
 
     def calc_fcosts(self):
         """Estimate costs
         Samme as prices but distinguishes for autoproducers"""
-        prices = 0 * pd.DataFrame().reindex_like(self.assets)
-        commodities = ["biogas", "biomethane", "electricity", "heat", "CO2", "H2", "feedstock"]
-
-        [prices.insert(loc=0, column=col, value=0) for col in commodities]
+        return self._frame(self.registry.costs)
 
-        prices.loc["AD", "biogas"] = 0.0  #euro / kWh
-        prices.loc["AD", "electricity"] = 0.044  #euro / kWh
-        prices.loc["ADCHP", "electricity"] = 0.044  #euro / kWh
-        prices.loc["ADU", "electricity"] = 0.044  #euro / kWh
-        prices.loc["ADH2", "electricity"] = 0.044  #euro / kWh
-        prices["biomethane"] = 0.0  #euro / kWh
-        #https://www.statista.com/statistics/1047083/natural-gas-price-european-union-country/
-        prices["heat"] = 0.06
-        prices["feedstock"] = -20 #euro/kWh
-        prices["H2"] = 3000 #euro/t
-        prices["ADH2", "CO2"] = 0 #euro/t
-        prices = prices.drop("capacity", axis=1)
-
-        prices = prices[commodities] / 1000# keuro / kWh
-        return prices 
-
-    
     def calc_updtprices(self, newprices: pd.DataFrame):
         """Receives new prices from users"""
         return newprices
@@ -368,7 +849,7 @@ class Assets:
 
     def calc_amort(self, capsubsidy: float, CO2split: float):
         capital_costs = self.calc_capsub(capsubsidy, CO2split)
-        amortization = 0.2 * capital_costs
+        amortization = capital_costs / self.amortisation_years
         return amortization
 
 
@@ -418,7 +899,108 @@ class Assets:
         return cflows
 
     def calc_rates(self, drate: float, start: int, stop: int):
-        return [1/(1 + drate)**i for i in np.arange(start, stop + 1, 1)]
+        """Discount factors from year start to stop, one row per rate if drate is an array"""
+        years = np.arange(start, stop + 1, 1)
+        return 1 / (1 + np.asarray(drate, dtype=float)[..., None])**years
+
+    def check_periods(self):
+        """Checks that the amortization period and NPV horizon fit in the lifetime"""
+        if not 0 < self.amortisation_years <= self.lifetime:
+            raise ValueError(f"Amortization period {self.amortisation_years} outside lifetime {self.lifetime}")
+        if not 0 <= self.horizon <= self.lifetime:
+            raise ValueError(f"NPV horizon {self.horizon} outside lifetime {self.lifetime}")
+
+    def calc_npv_rates(self,
+                       drates,
+                       capsubsidy: float,
+                       taxrate: float,
+                       CO2split: float,
+                       biometyield: float,
+                       heatgen: float,
+                       elecgen: float,
+                       newprices: pd.DataFrame,
+                       newcosts: pd.DataFrame):
+        """NPV at the horizon for a vector of discount rates, rate x technology
+        Annual flows do not depend on the discount rate, so they are evaluated once
+        and discounted with closed-form annuity factors"""
+        drates = np.atleast_1d(np.asarray(drates, dtype=float))
+        cashflows = self.calc_cashflows(capsubsidy, 0.0, taxrate, CO2split, biometyield,
+                                        heatgen, elecgen, newprices, newcosts)
+        npv = self.discount(drates[:, None],
+                            cashflows.capex.values[None, :],
+                            cashflows.annual["wam"].values[None, :],
+                            cashflows.annual["woam"].values[None, :])
+        return pd.DataFrame(npv, index=drates, columns=self.technologies)
+
+    def discount(self, drate, capex, cf_wam, cf_woam):
+        """NPV at the horizon of constant flows with and without amortization
+        All arguments broadcast against each other"""
+        amortised = min(self.amortisation_years, self.horizon)
+        return (- capex
+                + cf_wam * annuity_factor(drate, 1, amortised)
+                + cf_woam * annuity_factor(drate, self.amortisation_years + 1, self.horizon))
+
+    def calc_cashflows(self,
+                       capsubsidy: float,
+                       drate: float, #discount rate
+                       taxrate: float,
+                       CO2split: float,
+                       biometyield: float,
+                       heatgen: float,
+                       elecgen: float,
+                       newprices: pd.DataFrame,
+                       newcosts: pd.DataFrame):
+        """Evaluates capital costs, cash flows, NPV and payback in a single pass
+        Every intermediate is computed once, calc_npv and calc_payback are views on the result"""
+        scenario = Scenario(capsubsidy, drate, taxrate, CO2split, biometyield,
+                            heatgen, elecgen, newprices, newcosts)
+        return self.calc_scenario(scenario)
+
+    def calc_scenario(self, scenario: Scenario):
+        """Cash flows for a scenario, memoized on the plant and the scenario digest
+        Every call returns its own copy, so callers can modify the frames in place"""
+        key = self._plant_key() + (scenario.digest,)
+        return memo.get(key, lambda: self._calc_cashflows(scenario)).copy()
+
+    def _plant_key(self):
+        return (tuple(self.assets["capacity"].values), self.lifetime, self.hours,
+                self.utilisation_factor, self.LHV, self.amortisation_years, self.horizon,
+                self.registry.digest)
+
+    def calc_physical(self, scenario: Scenario):
+        """Capital costs before subsidies, production and consumption of the plant
+        Memoized on the physical parameters only, see Scenario.physical"""
+        key = self._plant_key() + scenario.physical_values()
+        capacity = self.assets["capacity"].values[:1].astype(float)
+        return physical_memo.get(key, lambda: self._batch_physical(capacity, *scenario.physical_values()))
+
+    def _calc_cashflows(self, scenario: Scenario):
+        # revenues are based on the reference prices, as in calc_revenues
+        costs = None
+        if scenario.newcosts.sum().sum() > 0:
+            costs = scenario.newcosts.loc[self.technologies, COMMODITIES].values / 1000
+
+        # only the price layer is recomputed when the physical layer is cached
+        batch = self.calc_economics(self.calc_physical(scenario), scenario.capsubsidy,
+                                    scenario.drate, scenario.taxrate, costs=costs)
+        return self.batch_to_cashflows(batch)
+
+    def batch_to_cashflows(self, batch: BatchResult, i: int = 0):
+        """CashFlows of plant i of a batch"""
+        years = list(np.arange(0, self.lifetime + 1, 1))
+        annual = pd.DataFrame(np.array([batch.cf_wam[i], batch.cf_woam[i]]).transpose(),
+                              index=self.technologies, columns=["wam", "woam"])
+        allcf = pd.DataFrame(batch.cflows[i], index=self.technologies, columns=years)
+        allcfcum = pd.DataFrame(batch.cumcflows[i], index=self.technologies, columns=years)
+        return CashFlows(capex=pd.Series(batch.capex[i], index=self.technologies, name="capital_costs"),
+                         annual=annual,
+                         discounted=allcf,
+                         cumulative=allcfcum,
+                         npv=pd.Series(batch.npv[i], index=self.technologies, name=self.horizon),
+                         payback=pd.Series(batch.payback[i], index=self.technologies),
+                         payback_years=pd.DataFrame({"simple": batch.payback_year[i],
+                                                     "discounted": batch.discounted_payback_year[i]},
+                                                    index=self.technologies))
 
     def calc_npv(self,
                  capsubsidy: float, 
@@ -431,33 +1013,9 @@ class Assets:
                  newprices: pd.DataFrame,
                  newcosts: pd.DataFrame):
 
-        capital_costs = self.calc_capsub(capsubsidy, CO2split)
-        npv = - capital_costs.sum(axis=1)
-        technologies = ["AD",	"ADCHP", "ADU",	"ADH2"]
-
-        cflows = self.calc_cf_wam(capsubsidy, taxrate, CO2split, biometyield, heatgen, elecgen, newprices, newcosts)
-
-        rates = self.calc_rates(drate, 1, 5)
-        allcf1 = pd.DataFrame(np.array([cflows * rates[i] for i in range(len(rates))]).transpose())
-        allcf1.columns = list(np.arange(1, 6, 1))
-        rates = self.calc_rates(drate, 6, self.lifetime)
-        cflows = self.calc_cf_woam(capsubsidy, taxrate, CO2split, biometyield, heatgen, elecgen, newprices, newcosts)
-
-        allcf2 = pd.DataFrame(np.array([cflows * rates[i] for i in range(len(rates))]).transpose())
-        allcf2.columns = list(np.arange(6, self.lifetime + 1, 1))
-
-        allcf = pd.concat((allcf1, allcf2), axis=1)
-
-        npv.index = [0,1,2,3]
-
-        allcf = pd.concat((npv, allcf), axis=1)
-
-        allcf.index = technologies
-        
-        allcfcum = allcf.cumsum(axis=1)
-
-        npv = allcfcum[20]
-        return allcf, allcfcum, npv
+        cashflows = self.calc_cashflows(capsubsidy, drate, taxrate, CO2split, biometyield,
+                                        heatgen, elecgen, newprices, newcosts)
+        return cashflows.discounted, cashflows.cumulative, cashflows.npv
 
     def calc_payback(self,
                     capsubsidy: float, 
@@ -469,43 +1027,289 @@ class Assets:
                     elecgen: float,
                     newprices: pd.DataFrame,
                     newcosts: pd.DataFrame):
-
-        allcf, allcfcum, npv = self.calc_npv(capsubsidy,
-                                             drate,
-                                             taxrate, 
-                                             CO2split, 
-                                             biometyield, 
-                                             heatgen, 
-                                             elecgen,
-                                             newprices,
-                                             newcosts)
-        capital_costs = self.calc_capsub(capsubsidy, CO2split)
-        npv = - capital_costs.sum(axis=1)
-        technologies = ["AD",	"ADCHP", "ADU",	"ADH2"]
-
-        cflows = self.calc_cf_wam(capsubsidy, taxrate, CO2split, biometyield, heatgen, elecgen, newprices, newcosts)
-
-        rates = self.calc_rates(drate, 1, 5)
-        allcf1 = pd.DataFrame(np.array([cflows * rates[i] for i in range(len(rates))]).transpose())
-        allcf1.columns = list(np.arange(1, 6, 1))
-        rates = self.calc_rates(drate, 6, self.lifetime)
-        cflows = self.calc_cf_woam(capsubsidy, taxrate, CO2split, biometyield, heatgen, elecgen, newprices, newcosts)
-
-        allcf2 = pd.DataFrame(np.array([cflows * rates[i] for i in range(len(rates))]).transpose())
-        allcf2.columns = list(np.arange(6, self.lifetime + 1, 1))
-
-        allcf = pd.concat((allcf1, allcf2), axis=1)
-
-        npv.index = [0,1,2,3]
-
-        allcf = pd.concat((npv, allcf), axis=1)
-
-        allcf.index = technologies
-        
-        allcfcum = allcf.cumsum(axis=1)
-
-        npv = allcfcum[20]
-
-        columns = list(np.arange(6, 20,1))
-
-        return capital_costs["capital_costs"] /allcf[columns].mean(axis=1)
\ No newline at end of file
+        """Capital costs over the average discounted cash flow after amortization (years 6 to 19 by default)"""
+        cashflows = self.calc_cashflows(capsubsidy, drate, taxrate, CO2split, biometyield,
+                                        heatgen, elecgen, newprices, newcosts)
+        return cashflows.payback
+
+    def calc_payback_years(self,
+                           capsubsidy: float,
+                           drate: float, #discount rate
+                           taxrate: float,
+                           CO2split: float,
+                           biometyield: float,
+                           heatgen: float,
+                           elecgen: float,
+                           newprices: pd.DataFrame,
+                           newcosts: pd.DataFrame):
+        """Simple and discounted payback years by technology
+        Interpolated within the year the cumulative cash flow turns positive, inf if never"""
+        cashflows = self.calc_cashflows(capsubsidy, drate, taxrate, CO2split, biometyield,
+                                        heatgen, elecgen, newprices, newcosts)
+        return cashflows.payback_years
+
+    def calc_irr(self,
+                 capsubsidy: float,
+                 drate: float, #discount rate
+                 taxrate: float,
+                 CO2split: float,
+                 biometyield: float,
+                 heatgen: float,
+                 elecgen: float,
+                 newprices: pd.DataFrame,
+                 newcosts: pd.DataFrame):
+        """Internal rate of return by technology, the discount rate at which the NPV is zero
+        nan when there is none, see irr"""
+        cashflows = self.calc_cashflows(capsubsidy, drate, taxrate, CO2split, biometyield,
+                                        heatgen, elecgen, newprices, newcosts)
+        return self.calc_cashflows_irr(cashflows)
+
+    def calc_cashflows_irr(self, cashflows: CashFlows):
+        """Internal rate of return by technology of computed CashFlows"""
+        result = self.calc_batch_irr(cashflows.capex.values, cashflows.annual["wam"].values,
+                                     cashflows.annual["woam"].values)
+        return pd.Series(result.rate, index=self.technologies, name="irr")
+
+    def calc_batch_irr(self, capex, cf_wam, cf_woam):
+        """Internal rates of return of a batch, plant x technology arrays as in BatchResult
+        The flows run up to the NPV horizon, so the NPV of calc_batch is zero at the IRR"""
+        self.check_periods()
+        amortised = min(self.amortisation_years, self.horizon)
+        annual = np.concatenate([-capex[..., None],
+                                 np.repeat(cf_wam[..., None], amortised, axis=-1),
+                                 np.repeat(cf_woam[..., None], self.horizon - amortised, axis=-1)], axis=-1)
+        return irr(annual)
+
+    def _powers(self, capacities: np.ndarray, CO2split=np.nan, biometyield=np.nan, heatgen=np.nan, elecgen=np.nan):
+        """Driver powers of the registry for an array of capacities, see Registry.powers"""
+        drivers = {"capacity": capacities,
+                   "MW": capacities * self.LHV / self.hours / 3600,
+                   "flow": self.utilisation_factor * capacities / self.hours,
+                   "CO2split": CO2split,
+                   "1-CO2split": 1 - np.asarray(CO2split),
+                   "biometyield": biometyield,
+                   "1-biometyield": 1 - np.asarray(biometyield),
+                   "heatgen": heatgen,
+                   "elecgen": elecgen}
+        return self.registry.powers(drivers, len(capacities))
+
+    def _batch_capcosts(self, capacities: np.ndarray, CO2split):
+        """Capital costs in kEUR (2024) for an array of capacities in cm/y, plant x technology"""
+        return self.registry.evaluate("capex", self._powers(capacities, CO2split))
+
+    def _batch_unitconsumption(self, capacities: np.ndarray, CO2split):
+        """Unit consumption in kWh/cm, plant x technology x commodity"""
+        return self.registry.evaluate("consumption", self._powers(capacities, CO2split))
+
+    def _batch_unitproduction(self, capacities: np.ndarray, CO2split, biometyield, heatgen, elecgen):
+        """Unit production, plant x technology x commodity"""
+        powers = self._powers(capacities, CO2split, biometyield, heatgen, elecgen)
+        return self.registry.evaluate("production", powers)
+
+    def _batch_production(self, capacities: np.ndarray, CO2split, biometyield, heatgen, elecgen):
+        """Annual production, plant x technology x commodity"""
+        production = self._batch_unitproduction(capacities, CO2split, biometyield, heatgen, elecgen)
+        production = production * capacities[:, None, None] * self.utilisation_factor
+        return production * self._cap2prod() * self.hours
+
+    def _batch_consumption(self, capacities: np.ndarray, CO2split):
+        """Annual consumption, plant x technology x commodity"""
+        consumption = self._batch_unitconsumption(capacities, CO2split)
+        consumption = consumption * capacities[:, None, None] * self.utilisation_factor
+        # consumption is calculated from the biogas flow in cm/h
+        return consumption * self._cap2cons()[Commodity.biogas] * self.hours
+
+    def calc_batch(self,
+                   capacities,
+                   capsubsidy,
+                   drate,
+                   taxrate,
+                   CO2split,
+                   biometyield,
+                   heatgen,
+                   elecgen,
+                   prices=None,
+                   costs=None):
+        """Evaluates a batch of plants in one vectorized pass
+        receives:
+        capacities: array of plant capacities (cm/y)
+        capsubsidy, drate, taxrate, CO2split, biometyield, heatgen, elecgen:
+            scalars or arrays with one value per plant
+        prices, costs: keuro / kWh, technology x commodity or plant x technology x commodity,
+            defaults to calc_prices and calc_fcosts
+        returns a BatchResult of plant x technology (x commodity / year) arrays"""
+        capacities = np.atleast_1d(np.asarray(capacities, dtype=float))
+        n = len(capacities)
+        CO2split, biometyield, heatgen, elecgen = [np.broadcast_to(np.asarray(p, dtype=float), (n,))
+                                                   for p in (CO2split, biometyield, heatgen, elecgen)]
+        physical = self._batch_physical(capacities, CO2split, biometyield, heatgen, elecgen)
+        return self.calc_economics(physical, capsubsidy, drate, taxrate, prices, costs)
+
+    def _batch_physical(self, capacities: np.ndarray, CO2split, biometyield, heatgen, elecgen):
+        """Price-independent layer for an array of capacities"""
+        return Physical(self._batch_capcosts(capacities, CO2split),
+                        self._batch_production(capacities, CO2split, biometyield, heatgen, elecgen),
+                        self._batch_consumption(capacities, CO2split))
+
+    def calc_economics(self, physical: Physical, capsubsidy, drate, taxrate, prices=None, costs=None):
+        """Price layer: subsidies, revenues, fuel costs and discounting of a physical layer
+        receives scalars or arrays with one value per plant, prices and costs as in calc_batch"""
+        n = len(physical.capex)
+        capsubsidy = np.broadcast_to(np.asarray(capsubsidy, dtype=float), (n,))
+        if prices is None:
+            prices = self.registry.prices
+        if costs is None:
+            costs = self.registry.costs
+
+        capex = physical.capex * (1 - capsubsidy)[:, None]
+        revenues = physical.production * prices
+        fuel_costs = physical.consumption * costs
+        return self.calc_batch_cashflows(capex, physical.production, physical.consumption,
+                                         revenues, fuel_costs, drate, taxrate)
+
+    def calc_batch_cashflows(self, capex, production, consumption, revenues, fuel_costs, drate, taxrate):
+        """Cash flows, NPV and payback from annual capital costs, flows, revenues and fuel costs
+        receives plant x technology (x commodity) arrays and one drate / taxrate per plant,
+        e.g. the annual totals of an hourly simulation, returns a BatchResult"""
+        n = len(capex)
+        drate = np.broadcast_to(np.asarray(drate, dtype=float), (n,))
+        taxrate = np.broadcast_to(np.asarray(taxrate, dtype=float), (n,))
+        self.check_periods()
+        fixed_costs = 0.1 * capex + 0.05 * capex
+        amortization = capex / self.amortisation_years
+        cf_woam = revenues.sum(axis=2) - fixed_costs - fuel_costs.sum(axis=2)
+        cf_wam = cf_woam - amortization
+        # taxes only apply when all technologies of a plant are profitable
+        cf_wam = np.where(np.all(cf_wam > 0, axis=1, keepdims=True), cf_wam * (1 - taxrate)[:, None], cf_wam)
+        cf_wam += amortization
+        cf_woam = np.where(np.all(cf_woam > 0, axis=1, keepdims=True), cf_woam * (1 - taxrate)[:, None], cf_woam)
+
+        amortised = self.amortisation_years
+        rates = self.calc_rates(drate, 1, self.lifetime)
+        cflows = np.empty((n, len(self.registry), self.lifetime + 1))
+        cflows[:, :, 0] = -capex
+        cflows[:, :, 1:amortised + 1] = cf_wam[:, :, None] * rates[:, None, :amortised]
+        cflows[:, :, amortised + 1:] = cf_woam[:, :, None] * rates[:, None, amortised:]
+        cumcflows = np.cumsum(cflows, axis=2)
+        npv = self.discount(drate[:, None], capex, cf_wam, cf_woam)
+        payback = capex / cflows[:, :, amortised + 1:self.horizon].mean(axis=2)
+
+        # simple payback from the undiscounted flows
+        annual = np.concatenate([-capex[:, :, None],
+                                 np.repeat(cf_wam[:, :, None], amortised, axis=2),
+                                 np.repeat(cf_woam[:, :, None], self.lifetime - amortised, axis=2)], axis=2)
+        payback_year = crossing_year(np.cumsum(annual, axis=2))
+        discounted_payback_year = crossing_year(cumcflows)
+
+        return BatchResult(capex, production, consumption, revenues, fuel_costs,
+                           cf_wam, cf_woam, cflows, cumcflows, npv, payback,
+                           payback_year, discounted_payback_year)
+
+    def _yearly(self, values, n: int, plants: bool = True):
+        """Plant x year array, year 0 is the investment year
+        receives a scalar, a (1 or plant) x (lifetime + 1) array of year-indexed values, or
+        a one-dimensional array of one value per plant (plants) or per year (not plants)"""
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 1 and plants:
+            values = np.broadcast_to(values, (n,))[:, None]
+        return np.broadcast_to(values, (n, self.lifetime + 1))
+
+    def _yearly_value(self, flows: np.ndarray, table, factors: dict, n: int):
+        """Plant x technology x year value of flows at the prices of a table
+        flows: plant x technology x commodity x (1 or year), table: (plant x) technology x commodity,
+        factors: {commodity: year-indexed factor on the commodity column}"""
+        table = np.broadcast_to(table, (n,) + np.shape(table)[-2:])
+        values = flows * table[..., None]
+        columns = [COMMODITIES.index(commodity) for commodity in factors]
+        total = np.delete(values, columns, axis=2).sum(axis=2)
+        total = np.array(np.broadcast_to(total, (n, len(self.registry), self.lifetime + 1)))
+        for column, factor in zip(columns, factors.values()):
+            total += values[:, :, column, :] * self._yearly(factor, n, plants=False)[:, None, :]
+        return total
+
+    def calc_trajectories(self,
+                          capacities,
+                          capsubsidy,
+                          drate,
+                          taxrate,
+                          CO2split,
+                          biometyield,
+                          heatgen,
+                          elecgen,
+                          prices=None,
+                          costs=None,
+                          price_factors: dict = None,
+                          cost_factors: dict = None,
+                          utilisation=None,
+                          investment=None):
+        """Evaluates a batch of plants on a technology x commodity x year tensor
+        receives:
+        capacities: array of plant capacities (cm/y)
+        capsubsidy, taxrate, CO2split, biometyield, heatgen, elecgen: scalars, one value per plant,
+            or (1 or plant) x (lifetime + 1) arrays of year-indexed values;
+            capsubsidy applies to the investments of each year, capital costs follow the year 0 values
+        drate: scalar or one value per plant
+        prices, costs: keuro / kWh tables as in calc_batch
+        price_factors, cost_factors: {commodity: factor on its price / cost}, lifetime + 1 values
+            or plant x (lifetime + 1), e.g. an escalation
+        utilisation: utilisation factor by year, flows scale with it from self.utilisation_factor
+        investment: fraction of the capital costs invested in each year, 1 in year 0 by default,
+            e.g. replacements; every investment is amortized over the following amortisation_years
+        returns a TrajectoryResult, with flat inputs it equals calc_batch"""
+        capacities = np.atleast_1d(np.asarray(capacities, dtype=float))
+        n = len(capacities)
+        years = self.lifetime + 1
+        technologies = len(self.registry)
+        self.check_periods()
+
+        flows = [np.asarray(p, dtype=float) for p in (CO2split, biometyield, heatgen, elecgen)]
+        if all(p.ndim < 2 for p in flows):
+            layer = self._batch_physical(capacities, *[np.broadcast_to(p, (n,)) for p in flows])
+            production, consumption = layer.production[..., None], layer.consumption[..., None]
+            capex = layer.capex
+        else:
+            # one physical layer per plant and year
+            layer = self._batch_physical(np.repeat(capacities, years), *[self._yearly(p, n).ravel() for p in flows])
+            production = layer.production.reshape(n, years, technologies, -1).transpose(0, 2, 3, 1)
+            consumption = layer.consumption.reshape(n, years, technologies, -1).transpose(0, 2, 3, 1)
+            capex = layer.capex.reshape(n, years, technologies)[:, 0]
+
+        prices = self.registry.prices if prices is None else prices
+        costs = self.registry.costs if costs is None else costs
+        revenues = self._yearly_value(production, prices, price_factors or {}, n)
+        fuel_costs = self._yearly_value(consumption, costs, cost_factors or {}, n)
+        if utilisation is not None:
+            scale = self._yearly(utilisation, n, False)[:, None, :] / self.utilisation_factor
+            revenues *= scale
+            fuel_costs *= scale
+        # the plant operates from year 1
+        revenues[:, :, 0] = 0
+        fuel_costs[:, :, 0] = 0
+
+        if investment is None:
+            investment = np.eye(1, years)
+        # fractions of the capital costs invested net of subsidies, plant x year
+        invested = self._yearly(investment, n, False) * (1 - self._yearly(capsubsidy, n))
+        investment = capex[:, :, None] * invested[:, None, :]
+        initial = investment[:, :, 0]
+        # straight-line amortization of each investment over the following years
+        amortised = self.amortisation_years
+        invested = np.concatenate([np.zeros((n, amortised + 1)), np.cumsum(invested, axis=1)], axis=1)
+        amortization = capex[:, :, None] * ((invested[:, amortised:amortised + years] - invested[:, :years]) / amortised)[:, None, :]
+
+        annual = revenues - fuel_costs
+        annual[:, :, 1:] -= (0.1 * initial + 0.05 * initial)[:, :, None]
+        annual -= amortization
+        # taxes only apply when all technologies of a plant are profitable in the year
+        profitable = np.all(annual > 0, axis=1, keepdims=True)
+        annual *= np.where(profitable, 1 - self._yearly(taxrate, n)[:, None, :], 1.0)
+        annual += amortization
+        annual -= investment
+
+        drate = np.broadcast_to(np.asarray(drate, dtype=float), (n,))
+        cflows = annual * self.calc_rates(drate, 0, self.lifetime)[:, None, :]
+        cumcflows = np.cumsum(cflows, axis=2)
+        npv = cumcflows[:, :, self.horizon]
+        payback = initial / cflows[:, :, amortised + 1:self.horizon].mean(axis=2)
+        return TrajectoryResult(investment, revenues, fuel_costs, annual, cflows, cumcflows, npv, payback,
+                                crossing_year(np.cumsum(annual, axis=2)), crossing_year(cumcflows))
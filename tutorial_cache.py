@@ -0,0 +1,133 @@
+import os
+import pandas as pd
+import sensitivity
+import streamlit as st
+import training as train
+from breakeven import solve_breakeven
+from contextlib import contextmanager
+from lattice import load_lattice
+from store import INDEX, open_store
+
+# results shared by every session of the app process
+MAX_ENTRIES = 1024 # scenarios kept, least recently used are evicted first
+TTL = 3600 # seconds before a cached scenario is recomputed
+
+
+# precomputed results for the discrete inputs of the tutorials, see lattice.py
+LATTICE = load_lattice()
+
+
+def calc_cashflows(capacity: float,
+                   capsubsidy: float,
+                   drate: float,
+                   taxrate: float,
+                   CO2split: float,
+                   biometyield: float,
+                   heatgen: float,
+                   elecgen: float,
+                   newprices: pd.DataFrame,
+                   newcosts: pd.DataFrame):
+    """Cash flows of a plant for the tutorial pages
+    Read from the precomputed lattice when possible, computed and cached otherwise"""
+    inputs = (capacity, capsubsidy, drate, taxrate, CO2split, biometyield,
+              heatgen, elecgen, newprices, newcosts)
+    if LATTICE is not None:
+        cashflows = LATTICE.lookup(*inputs)
+        if cashflows is not None:
+            return cashflows
+    return calc_live_cashflows(*inputs)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, ttl=TTL, show_spinner=False)
+def calc_live_cashflows(capacity: float,
+                        capsubsidy: float,
+                        drate: float,
+                        taxrate: float,
+                        CO2split: float,
+                        biometyield: float,
+                        heatgen: float,
+                        elecgen: float,
+                        newprices: pd.DataFrame,
+                        newcosts: pd.DataFrame):
+    """Cash flows computed with Assets
+    Cached across sessions, each caller receives its own copy of the result"""
+    assets = train.Assets(capacity)
+    return assets.calc_cashflows(capsubsidy, drate, taxrate, CO2split, biometyield,
+                                 heatgen, elecgen, newprices, newcosts)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, ttl=TTL, show_spinner=False)
+def calc_breakeven(variable: str,
+                   capacity: float,
+                   capsubsidy: float,
+                   drate: float,
+                   taxrate: float,
+                   CO2split: float,
+                   biometyield: float,
+                   heatgen: float,
+                   elecgen: float,
+                   newcosts: pd.DataFrame):
+    """Break-even value of variable by technology, see breakeven.solve_breakeven
+    Revenues are based on the reference prices, as in calc_cashflows"""
+    assets = train.Assets(capacity)
+    costs = None
+    if newcosts.sum().sum() > 0:
+        costs = newcosts.loc[assets.technologies, train.COMMODITIES].values / 1000
+    breakeven = solve_breakeven(variable, assets=assets, costs=costs,
+                                capacity=capacity, capsubsidy=capsubsidy, drate=drate, taxrate=taxrate,
+                                CO2split=CO2split, biometyield=biometyield, heatgen=heatgen, elecgen=elecgen)
+    return breakeven.iloc[0]
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, ttl=TTL, show_spinner=False)
+def calc_sensitivity(capacity: float,
+                     step: float,
+                     capsubsidy: float,
+                     drate: float,
+                     taxrate: float,
+                     CO2split: float,
+                     biometyield: float,
+                     heatgen: float,
+                     elecgen: float):
+    """Sensitivity of the NPV to every input and price / cost cell, see sensitivity.calc_sensitivity"""
+    return sensitivity.calc_sensitivity(train.Assets(capacity), step,
+                                        capsubsidy=capsubsidy, drate=drate, taxrate=taxrate,
+                                        CO2split=CO2split, biometyield=biometyield,
+                                        heatgen=heatgen, elecgen=elecgen)
+
+
+def open_result_store(path: str):
+    """Result store shared by every session, its arrays are memory-mapped, see store.py
+    Reopened when the store is rewritten, as its index is written last"""
+    return _open_result_store(path, os.path.getmtime(os.path.join(path, INDEX)))
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _open_result_store(path: str, modified: float):
+    return open_store(path)
+
+
+@contextmanager
+def profiling():
+    """Profiles the Assets methods during the page body when the page is opened with ?debug=1
+    and shows the timings in the sidebar. The methods are restored even when the rerun is
+    interrupted or fails. The profiler is shared by the process, concurrent sessions are recorded as well"""
+    if st.query_params.get("debug") != "1":
+        yield
+        return
+    train.profiler.reset()
+    with train.profiler:
+        yield
+    show_profiling()
+
+
+def show_profiling():
+    """Sidebar panel with the timings recorded since the profiler was reset"""
+    with st.sidebar.expander("Timings", expanded=True):
+        summary = train.profiler.summary()
+        if summary.empty:
+            st.write("No model evaluation in this rerun, results were read from the lattice or the cache.")
+        else:
+            st.dataframe(summary * [1, 1000, 1000], column_config={"total": "total (ms)", "own": "own (ms)"})
+        st.write(train.profiler.cache())
+        st.code(train.profiler.report())